@@ -9,7 +9,7 @@ from typing import Any
 import validators
 from asyncpg import CheckViolationError, InterfaceError, PostgresError, UniqueViolationError
 
-from aiven.db.crud import create_new_url, remove_url_by_url, remove_url_by_url_and_regex
+from aiven.db.crud import CHECK_MODES, create_new_url, remove_url_by_url, remove_url_by_url_and_regex
 from aiven.db.db import get_db_connection
 from conf.config import settings
 
@@ -50,13 +50,24 @@ parser.add_argument("action", type=str, choices=["add", "remove"], help="action"
 parser.add_argument("url", type=url, help="valid url, for instance http://test.com")
 parser.add_argument("-p", "--period", type=period, help="interval between requests", default=5)
 parser.add_argument("-r", "--regex", type=regex, required=False, help="regex, for instance .*")
+parser.add_argument(
+    "-m",
+    "--mode",
+    type=str,
+    choices=CHECK_MODES,
+    default="full",
+    help="full - GET with body, status-only - GET without body, head - HEAD request",
+)
+
 
+async def add_url(url: str, period: int, regex: str | None = None, check_mode: str = "full") -> None:
+    if regex and check_mode != "full":
+        raise argparse.ArgumentTypeError("regex can't be checked in %s mode" % check_mode)
 
-async def add_url(url: str, period: int, regex: str | None = None) -> None:
     try:
         async with get_db_connection() as connection:
             try:
-                await create_new_url(connection, url, period, regex)
+                await create_new_url(connection, url, period, regex, check_mode)
             except UniqueViolationError:
                 logger.exception("Add url error")
                 raise argparse.ArgumentTypeError("(%s, %s) is not an unique url, regex value" % (url, regex))
@@ -87,7 +98,7 @@ if __name__ == "__main__":
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     if args.action == "add":
-        loop.run_until_complete(add_url(args.url, args.period, args.regex))
+        loop.run_until_complete(add_url(args.url, args.period, args.regex, args.mode))
     elif args.action == "remove":
         loop.run_until_complete(remove_url(args.url, args.regex))
 
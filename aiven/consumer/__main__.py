@@ -1,10 +1,8 @@
-import asyncio
-
-from aiven.consumer.worker import start_workers
+from aiven.consumer.supervisor import Supervisor, run_consumer
 from conf.config_consumer import settings
 
 if __name__ == "__main__":
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(start_workers(settings.CONCURRENCY))
-    loop.close()
+    if settings.PROCESSES > 1:
+        Supervisor(settings.PROCESSES, settings.RESTART_DELAY, settings.SHUTDOWN_TIMEOUT).run()
+    else:
+        run_consumer()
@@ -0,0 +1,93 @@
+import ssl
+import time
+from collections.abc import Awaitable, Callable, Generator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, TraceConfig
+
+from conf.config_consumer import settings
+
+
+@dataclass
+class RequestTimings:
+    """Durations (seconds, monotonic clock) of request phases. Durations of every hop of redirects are summed."""
+
+    connection_wait_time: float | None = None
+    dns_time: float | None = None
+    connect_time: float | None = None
+    first_byte_time: float | None = None
+
+    def add(self, name: str, duration: float) -> None:
+        setattr(self, name, (getattr(self, name) or 0) + duration)
+
+
+def on_start(name: str) -> Callable[[ClientSession, SimpleNamespace, object], Awaitable[None]]:
+    async def hook(session: ClientSession, context: SimpleNamespace, params: object) -> None:
+        context.started_at[name] = time.monotonic()
+        # every connection of redirects resolves its host
+        if name == "connect_time":
+            context.dns_time = 0.0
+
+    return hook
+
+
+def on_end(name: str) -> Callable[[ClientSession, SimpleNamespace, object], Awaitable[None]]:
+    async def hook(session: ClientSession, context: SimpleNamespace, params: object) -> None:
+        started_at = context.started_at.pop(name, None)
+        if not isinstance(context.trace_request_ctx, RequestTimings) or started_at is None:
+            return
+
+        duration = time.monotonic() - started_at
+        # host is resolved during creating of connection, connect_time is only tcp and tls handshakes
+        if name == "dns_time":
+            context.dns_time += duration
+        elif name == "connect_time":
+            duration -= context.dns_time
+
+        context.trace_request_ctx.add(name, duration)
+
+    return hook
+
+
+async def on_request_start(session: ClientSession, context: SimpleNamespace, params: object) -> None:
+    context.started_at = {"first_byte_time": time.monotonic()}
+    context.dns_time = 0.0
+
+
+async def on_request_redirect(session: ClientSession, context: SimpleNamespace, params: object) -> None:
+    # headers of redirect are received, the next hop is a new request
+    await on_end("first_byte_time")(session, context, params)
+    await on_start("first_byte_time")(session, context, params)
+
+
+def get_trace_config() -> TraceConfig:
+    """Fills `RequestTimings` passed as `trace_request_ctx` of request."""
+    trace_config = TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    # on_request_end is sent when headers of response are received
+    trace_config.on_request_end.append(on_end("first_byte_time"))
+    trace_config.on_request_redirect.append(on_request_redirect)
+    trace_config.on_connection_queued_start.append(on_start("connection_wait_time"))
+    trace_config.on_connection_queued_end.append(on_end("connection_wait_time"))
+    trace_config.on_connection_create_start.append(on_start("connect_time"))
+    trace_config.on_connection_create_end.append(on_end("connect_time"))
+    trace_config.on_dns_resolvehost_start.append(on_start("dns_time"))
+    trace_config.on_dns_resolvehost_end.append(on_end("dns_time"))
+    return trace_config
+
+
+@asynccontextmanager
+async def get_http_session() -> Generator[ClientSession, None, None]:
+    """One session per process, so all workers share connections, DNS cache and SSL context."""
+    connector = TCPConnector(
+        limit=settings.HTTP_LIMIT,
+        limit_per_host=settings.HTTP_LIMIT_PER_HOST,
+        ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+        ssl=ssl.create_default_context(),
+    )
+    timeout = ClientTimeout(total=settings.HTTP_REQUEST_TIMEOUT)
+    async with ClientSession(connector=connector, timeout=timeout, trace_configs=[get_trace_config()]) as session:
+        yield session
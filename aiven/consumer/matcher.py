@@ -0,0 +1,143 @@
+import codecs
+import re
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, AnyStr
+
+from aiven.metrics import regex_cache_hits, regex_cache_misses
+from conf.config_consumer import settings
+
+# non-ascii characters, unicode classes and escapes, case-insensitive and unicode flags match differently in bytes,
+# unescaped dot and negated class match one byte of multibyte character
+UNICODE_REGEX = re.compile(r"[^\x00-\x7f]|\\[wWdDsSbBxuUN]|\(\?[a-zA-Z]*[iu]|(?<!\\)(?:\\\\)*(?:\.|\[\^)")
+
+
+class RegexCache:
+    """LRU cache of compiled regexes.
+
+    `re` has its own cache, but it's small and it's cleared completely when it's full.
+    """
+
+    def __init__(self, size: int, compile_regex: Callable[[Hashable], Any] = re.compile) -> None:
+        self.__size = size
+        self.__compile = compile_regex
+        self.__patterns: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.__patterns)
+
+    def get(self, regex: Hashable) -> Any:
+        if (pattern := self.__patterns.get(regex)) is not None:
+            self.hits += 1
+            self.__patterns.move_to_end(regex)
+            return pattern
+
+        self.misses += 1
+        pattern = self.__compile(regex)
+        self.__patterns[regex] = pattern
+        if len(self.__patterns) > self.__size:
+            self.__patterns.popitem(last=False)
+
+        return pattern
+
+
+regex_cache = RegexCache(settings.REGEX_CACHE_SIZE)
+regex_cache_hits.set_function(lambda: regex_cache.hits)
+regex_cache_misses.set_function(lambda: regex_cache.misses)
+
+
+def get_match_result(match: re.Match[AnyStr]) -> AnyStr:
+    """The same value as `re.findall` returns for pattern with one group or without groups."""
+    return match.group(1) if match.re.groups else match.group()
+
+
+def is_ascii_compatible(encoding: str) -> bool:
+    try:
+        return "ascii".encode(encoding) == b"ascii"
+    except LookupError:
+        return False
+
+
+def get_bytes_regex(regex: str, encoding: str) -> bytes | None:
+    """Returns regex for matching raw body or None when regex needs unicode semantics."""
+    if UNICODE_REGEX.search(regex) or not is_ascii_compatible(encoding):
+        return None
+
+    bytes_regex = regex.encode("ascii")
+    try:
+        regex_cache.get(bytes_regex)
+    except re.error:
+        # regex is matched against decoded body, like without BYTES_REGEX
+        return None
+
+    return bytes_regex
+
+
+def decode_results(results: list[bytes], encoding: str) -> list[str]:
+    try:
+        return [result.decode(encoding, errors="replace") for result in results]
+    except LookupError:
+        return [result.decode("utf-8", errors="replace") for result in results]
+
+
+def get_decoder(encoding: str) -> codecs.IncrementalDecoder:
+    try:
+        return codecs.getincrementaldecoder(encoding)(errors="replace")
+    except LookupError:
+        return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+class StreamMatcher:
+    """Matches regex (str or bytes) against text which comes by chunks.
+
+    Between chunks only the last `overlap` characters are kept, so memory doesn't depend on size of body,
+    but a match longer than `overlap` can be cut or missed.
+    """
+
+    def __init__(self, regex: AnyStr, overlap: int, find_all: bool = True) -> None:
+        self.__pattern = regex_cache.get(regex)
+        self.__overlap = overlap
+        self.__find_all = find_all
+        self.__buffer = regex[:0]
+        self.__results: list[AnyStr] = []
+
+    @property
+    def results(self) -> list[AnyStr]:
+        return self.__results
+
+    @property
+    def done(self) -> bool:
+        return bool(self.__results) and not self.__find_all
+
+    def feed(self, text: AnyStr) -> None:
+        self.__buffer += text
+        # match which ends inside of the overlap window could continue in the next chunk
+        safe_end = len(self.__buffer) - self.__overlap
+        keep_from = 0
+        for match in self.__pattern.finditer(self.__buffer):
+            if match.end() > safe_end:
+                # match isn't longer than overlap, otherwise it's cut
+                keep_from = max(match.start(), safe_end - self.__overlap, 0)
+                break
+
+            self.__results.append(get_match_result(match))
+            keep_from = match.end()
+            if self.done:
+                break
+
+        else:
+            keep_from = max(keep_from, safe_end)
+
+        self.__buffer = self.__buffer[keep_from:]
+
+    def close(self) -> list[AnyStr]:
+        for match in self.__pattern.finditer(self.__buffer):
+            if self.done:
+                break
+
+            self.__results.append(get_match_result(match))
+
+        self.__buffer = self.__buffer[:0]
+        return self.__results
@@ -0,0 +1,146 @@
+import codecs
+import logging
+import re
+from collections.abc import Sequence
+from typing import Any
+
+from aiven.consumer.matcher import RegexCache
+
+logger = logging.getLogger(__name__)
+
+# unicode tables of hyperscan are older than ones of python, so classes are widened up to any non-ascii character
+CLASS_ESCAPES = {
+    "w": r"\x30-\x39\x41-\x5a\x5f\x61-\x7a\x{80}-\x{10ffff}",
+    "W": r"\x00-\x2f\x3a-\x40\x5b-\x5e\x60\x7b-\x{10ffff}",
+    "d": r"\x30-\x39\x{80}-\x{10ffff}",
+    "D": r"\x00-\x2f\x3a-\x{10ffff}",
+    "s": r"\x09-\x0d\x1c-\x20\x{80}-\x{10ffff}",
+    "S": r"\x00-\x08\x0e-\x1b\x21-\x{10ffff}",
+}
+# `{,n}` is python only syntax, hyperscan reads it as literal
+OMITTED_MIN_REGEX = re.compile(r"\{,(\d*)\}")
+# `]` right after `[` or `[^` is a literal
+CLASS_START_REGEX = re.compile(r"\[(\^?)\]?")
+# comments of verbose mode and case folding of non-ascii characters aren't rewritten
+UNSUPPORTED_FLAGS_REGEX = re.compile(r"\(\?[a-zA-Z]*x|\(\?[a-zA-Z]*i.*[^\x00-\x7f]", re.DOTALL)
+
+
+def get_prefilter_expression(regex: str) -> str | None:
+    """Returns hyperscan expression which matches at least everything which python regex matches.
+
+    Returns None if there is no such expression, then regex is always matched by `re`.
+    """
+    if UNSUPPORTED_FLAGS_REGEX.search(regex):
+        return None
+
+    parts = []
+    # None outside of character class, otherwise whether the class is negated
+    negated_class: bool | None = None
+    index = 0
+    while index < len(regex):
+        if regex[index] == "\\":
+            escape = regex[index : index + 2]
+            if (part := get_escape_expression(escape, negated_class)) is None:
+                return None
+
+            parts.append(part)
+            index += len(escape)
+        elif negated_class is None and (match := CLASS_START_REGEX.match(regex, index)):
+            negated_class = bool(match[1])
+            parts.append(match[0])
+            index = match.end()
+        elif negated_class is None and (match := OMITTED_MIN_REGEX.match(regex, index)):
+            parts.append(f"{{0,{match[1]}}}")
+            index = match.end()
+        else:
+            if regex[index] == "]":
+                negated_class = None
+
+            parts.append(regex[index])
+            index += 1
+
+    return "".join(parts)
+
+
+def get_escape_expression(escape: str, negated_class: bool | None) -> str | None:
+    escaped = escape[1:]
+    if escaped in CLASS_ESCAPES:
+        if negated_class is None:
+            return f"[{CLASS_ESCAPES[escaped]}]"
+
+        # widened class inside of negated class would narrow it
+        return None if negated_class else CLASS_ESCAPES[escaped]
+
+    if escaped in ("b", "B") and negated_class is None:
+        # boundary depends on unicode tables too, without it expression matches more
+        return ""
+
+    return escape
+
+
+def is_utf8(encoding: str) -> bool:
+    try:
+        return codecs.lookup(encoding).name in ("utf-8", "ascii")
+    except LookupError:
+        return False
+
+
+class Prefilter:
+    """Finds regexes which can match body by one scan of body with hyperscan.
+
+    Regexes are compiled in prefiltering mode: hyperscan can report regex which doesn't match,
+    but it never misses a match, so only reported regexes have to be matched by `re`.
+    """
+
+    def __init__(self, cache_size: int) -> None:
+        try:
+            import hyperscan
+        except ImportError:
+            logger.exception("REGEX_ENGINE is hyperscan, but hyperscan isn't installed")
+            raise
+
+        self.__hyperscan = hyperscan
+        self.__flags = (
+            hyperscan.HS_FLAG_PREFILTER
+            | hyperscan.HS_FLAG_SINGLEMATCH
+            | hyperscan.HS_FLAG_ALLOWEMPTY
+            | hyperscan.HS_FLAG_UTF8
+            | hyperscan.HS_FLAG_UCP
+        )
+        # one database for all regexes of url
+        self.__databases = RegexCache(cache_size, self.__compile)
+
+    def get_candidates(self, regexes: Sequence[str | None], body: bytes) -> set[int]:
+        """Returns indexes of regexes which can match body. Body has to be a valid utf-8."""
+        indexes = [index for index, regex in enumerate(regexes) if regex]
+        database, unsupported = self.__databases.get(tuple(regexes[index] for index in indexes))
+        candidates = set(unsupported)
+        if database is not None:
+            database.scan(body, match_event_handler=lambda regex_id, *_: candidates.add(regex_id))
+
+        return {indexes[regex_id] for regex_id in candidates}
+
+    def __compile(self, regexes: tuple[str, ...]) -> tuple[Any | None, set[int]]:
+        expressions = [get_prefilter_expression(regex) for regex in regexes]
+        ids = [regex_id for regex_id, expression in enumerate(expressions) if expression is not None]
+        database = self.__build(expressions, ids) if ids else None
+        if database is None:
+            # regex which isn't supported by hyperscan is always matched by `re`
+            ids = [regex_id for regex_id in ids if self.__build(expressions, [regex_id]) is not None]
+            database = self.__build(expressions, ids) if ids else None
+
+        return database, set(range(len(regexes))) - set(ids)
+
+    def __build(self, expressions: list[str | None], ids: list[int]) -> Any | None:
+        database = self.__hyperscan.Database()
+        try:
+            database.compile(
+                expressions=[expressions[regex_id].encode() for regex_id in ids],
+                ids=ids,
+                elements=len(ids),
+                flags=[self.__flags] * len(ids),
+            )
+        except self.__hyperscan.error:
+            return None
+
+        return database
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from asyncio import Event, sleep, wait_for
+from contextlib import suppress
+
+from asyncpg import InterfaceError, Pool, PostgresError
+
+from aiven.db.crud import reap_expired_tasks
+from conf.config_consumer import settings
+
+logger = logging.getLogger(__name__)
+
+LEASE_EXPIRED_ERROR = "LeaseExpired: task wasn't finished in %s attempts"
+
+
+async def reap_tasks(pool: Pool) -> int:
+    """Requeues tasks with expired lease (or fails them after MAX_TASK_ATTEMPTS) by batches."""
+    amount_of_tasks = 0
+    while True:
+        async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
+            reaped_tasks = await reap_expired_tasks(
+                connection,
+                settings.REAPER_BATCH_SIZE,
+                settings.MAX_TASK_ATTEMPTS,
+                LEASE_EXPIRED_ERROR % settings.MAX_TASK_ATTEMPTS,
+            )
+
+        amount_of_tasks += len(reaped_tasks)
+        if len(reaped_tasks) < settings.REAPER_BATCH_SIZE:
+            return amount_of_tasks
+
+
+async def start_reaper(stop_event: Event, pool: Pool) -> None:
+    while not stop_event.is_set():
+        try:
+            if amount_of_tasks := await reap_tasks(pool):
+                logger.warning("Reap %s tasks with expired lease", amount_of_tasks)
+        except (PostgresError, InterfaceError, asyncio.TimeoutError):
+            logger.exception("Exception in consumer's reaper")
+            await sleep(settings.SLEEP_AFTER_EXCEPTION)
+
+        with suppress(asyncio.TimeoutError):
+            await wait_for(stop_event.wait(), timeout=settings.REAPER_INTERVAL)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from asyncio import Semaphore, get_running_loop, wait_for
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from multiprocessing.shared_memory import SharedMemory
+from typing import AnyStr
+
+from aiven.consumer.matcher import regex_cache
+
+logger = logging.getLogger(__name__)
+
+
+class RegexTimeoutError(Exception):
+    pass
+
+
+def findall(regex: AnyStr, body: bytes | None, shared_memory_name: str | None, encoding: str | None) -> list[AnyStr]:
+    """Runs in process of pool. Big body comes through shared memory instead of pickling."""
+    if shared_memory_name is None:
+        return match(regex, body, encoding)
+
+    # shared memory is unlinked by consumer's process
+    shared_memory = SharedMemory(name=shared_memory_name)
+    try:
+        return match(regex, shared_memory.buf, encoding)
+    finally:
+        shared_memory.close()
+
+
+def match(regex: AnyStr, body: bytes | memoryview, encoding: str | None) -> list[AnyStr]:
+    if encoding is None:
+        # matches of bytes-like body are copied into bytes, they don't refer to shared memory
+        return regex_cache.get(regex).findall(body)
+
+    return regex_cache.get(regex).findall(bytes(body).decode(encoding, errors="replace"))
+
+
+class RegexPool:
+    """Matches regexes in separate processes, so slow regex doesn't block event loop.
+
+    Processes of pool are killed when regex isn't matched in `timeout` seconds.
+    """
+
+    def __init__(self, max_workers: int, timeout: float, shared_memory_size: int) -> None:
+        self.__max_workers = max_workers
+        self.__timeout = timeout
+        self.__shared_memory_size = shared_memory_size
+        self.__executor = ProcessPoolExecutor(max_workers=max_workers)
+        # timeout is counted only for running task, not for task waiting for free process
+        self.__semaphore = Semaphore(max_workers)
+
+    async def findall(self, regex: AnyStr, body: bytes, encoding: str | None = None) -> list[AnyStr]:
+        """Returns the same as `re.findall`, body is decoded by `encoding` for str regex."""
+        shared_memory = None
+        if body and len(body) >= self.__shared_memory_size:
+            shared_memory = SharedMemory(create=True, size=len(body))
+            shared_memory.buf[: len(body)] = body
+
+        try:
+            # task is sent once more if pool was restarted because of another task
+            for _ in range(2):
+                executor = self.__executor
+                if shared_memory is None:
+                    func = partial(findall, regex, body, None, encoding)
+                else:
+                    func = partial(findall, regex, None, shared_memory.name, encoding)
+
+                try:
+                    async with self.__semaphore:
+                        future = get_running_loop().run_in_executor(executor, func)
+                        return await wait_for(future, timeout=self.__timeout)
+                except asyncio.TimeoutError:
+                    self.__restart(executor)
+                    raise RegexTimeoutError(f"regex wasn't matched in {self.__timeout} seconds") from None
+                except BrokenProcessPool:
+                    self.__restart(executor)
+
+            raise RegexTimeoutError("regex process pool is broken")
+        finally:
+            if shared_memory is not None:
+                shared_memory.close()
+                shared_memory.unlink()
+
+    def __restart(self, executor: ProcessPoolExecutor) -> None:
+        if executor is not self.__executor:
+            return
+
+        logger.warning("Restart regex process pool")
+        self.__executor = ProcessPoolExecutor(max_workers=self.__max_workers)
+        self.__kill(executor)
+
+    @staticmethod
+    def __kill(executor: ProcessPoolExecutor) -> None:
+        # ProcessPoolExecutor can't cancel running task, so its processes are killed
+        for process in list(executor._processes.values()):
+            process.kill()
+
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        self.__executor.shutdown(cancel_futures=True)
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from asyncio import Event, Queue, get_running_loop, sleep, wait_for
+from datetime import datetime
+
+from asyncpg import InterfaceError, Pool, PostgresError
+
+from aiven.db.crud import TaskResult, finish_tasks, set_results
+from aiven.metrics import tasks_dropped, tasks_written
+from conf.config_consumer import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ResultSink:
+    """Buffers results of checks and writes them to db by batches.
+
+    Buffer is bounded, so workers wait in `put` while db can't keep up with them.
+    Results of tasks which aren't held by their claim anymore (lease is expired) are dropped.
+    """
+
+    def __init__(
+        self,
+        pool: Pool,
+        batch_size: int = settings.RESULT_BATCH_SIZE,
+        flush_interval: float = settings.RESULT_FLUSH_INTERVAL,
+        buffer_size: int = settings.RESULT_BUFFER_SIZE,
+    ) -> None:
+        self.__pool = pool
+        self.__batch_size = batch_size
+        self.__flush_interval = flush_interval
+        self.__buffer: Queue[tuple[TaskResult, datetime]] = Queue(maxsize=buffer_size)
+
+    async def put(self, task_result: TaskResult, claimed_at: datetime) -> None:
+        """`claimed_at` is time of claim of task in db."""
+        await self.__buffer.put((task_result, claimed_at))
+
+    async def run(self, stop_event: Event) -> None:
+        while not (stop_event.is_set() and self.__buffer.empty()):
+            if batch := await self.__collect():
+                await self.__flush(batch)
+
+    async def __collect(self) -> list[tuple[TaskResult, datetime]]:
+        loop = get_running_loop()
+        deadline = loop.time() + self.__flush_interval
+        batch = []
+        while len(batch) < self.__batch_size:
+            if not self.__buffer.empty():
+                batch.append(self.__buffer.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(await wait_for(self.__buffer.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def __flush(self, batch: list[tuple[TaskResult, datetime]]) -> None:
+        task_ids = [task_result.task_id for task_result, _ in batch]
+        claimed_ats = [claimed_at for _, claimed_at in batch]
+        for _ in range(settings.RESULT_FLUSH_ATTEMPTS):
+            try:
+                async with self.__pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
+                    async with connection.transaction():
+                        finished_ids = set(await finish_tasks(connection, task_ids, claimed_ats))
+                        results = [task_result for task_result, _ in batch if task_result.task_id in finished_ids]
+                        await set_results(connection, results)
+            except (PostgresError, InterfaceError, asyncio.TimeoutError):
+                logger.exception("Can't write %s results", len(batch))
+                await sleep(settings.SLEEP_AFTER_EXCEPTION)
+            else:
+                if len(results) < len(batch):
+                    logger.warning("Drop %s results of tasks with expired lease", len(batch) - len(results))
+
+                logger.info("Write %s results", len(results))
+                tasks_written.inc(amount=len(results))
+                return
+
+        logger.error("Drop %s results after %s attempts", len(batch), settings.RESULT_FLUSH_ATTEMPTS)
+        tasks_dropped.inc(amount=len(batch))
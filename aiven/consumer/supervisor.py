@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+from asyncio import AbstractEventLoop, Event
+from multiprocessing import Process
+from multiprocessing.connection import wait
+from types import FrameType
+
+from aiven.consumer.worker import start_workers
+from aiven.memory import MEMORY_SIGNAL, MemoryTracker, add_memory_diagnostics
+from aiven.profiler import PROFILE_SIGNAL, StackSampler, add_profile_signal_handler
+from conf.config_consumer import settings
+
+logger = logging.getLogger(__name__)
+
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+def new_event_loop() -> AbstractEventLoop:
+    if settings.EVENT_LOOP == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            logger.exception("EVENT_LOOP is uvloop, but uvloop isn't installed")
+            raise
+
+        return uvloop.new_event_loop()
+
+    return asyncio.new_event_loop()
+
+
+def run_consumer(number: int = 0) -> None:
+    """Runs consumer in current process until SIGTERM or SIGINT."""
+    # forked process inherits handlers of supervisor, they pass signals to processes of supervisor
+    for stop_signal in STOP_SIGNALS:
+        signal.signal(stop_signal, signal.SIG_DFL)
+
+    for diagnostics_signal in (PROFILE_SIGNAL, MEMORY_SIGNAL):
+        signal.signal(diagnostics_signal, signal.SIG_IGN)
+
+    # every process of supervisor serves its own metrics
+    settings.METRICS_PORT += number
+    loop = new_event_loop()
+    asyncio.set_event_loop(loop)
+    stop_event = Event()
+    for stop_signal in STOP_SIGNALS:
+        loop.add_signal_handler(stop_signal, stop_event.set)
+
+    sampler = StackSampler("consumer", settings.PROFILE_INTERVAL, settings.PROFILE_DURATION, settings.PROFILE_DIR)
+    add_profile_signal_handler(loop, sampler)
+    if settings.MEMORY_DIAGNOSTICS:
+        tracker = MemoryTracker(
+            "consumer",
+            settings.MEMORY_TOP_SIZE,
+            settings.MEMORY_TRACEBACK_DEPTH,
+            settings.PROFILE_DIR,
+        )
+        add_memory_diagnostics(loop, tracker, settings.MEMORY_SNAPSHOT_INTERVAL)
+
+    loop.run_until_complete(start_workers(settings.CONCURRENCY, stop_event))
+    loop.close()
+
+
+class Supervisor:
+    """Runs consumer in `processes` child processes and restarts crashed ones.
+
+    SIGTERM or SIGINT is sent to children, they finish claimed tasks and stop.
+    SIGUSR1 (profiling) and SIGUSR2 (memory report, only with MEMORY_DIAGNOSTICS) are passed to children.
+    """
+
+    def __init__(self, processes: int, restart_delay: float, shutdown_timeout: float) -> None:
+        self.__amount_of_processes = processes
+        self.__processes: list[Process] = []
+        self.__restart_delay = restart_delay
+        self.__shutdown_timeout = shutdown_timeout
+        self.__stopping = False
+
+    def run(self) -> None:
+        for stop_signal in STOP_SIGNALS:
+            signal.signal(stop_signal, self.__stop)
+
+        signal.signal(PROFILE_SIGNAL, self.__pass_signal)
+        if settings.MEMORY_DIAGNOSTICS:
+            signal.signal(MEMORY_SIGNAL, self.__pass_signal)
+
+        self.__processes = [self.__start(number) for number in range(self.__amount_of_processes)]
+        while not self.__stopping:
+            wait([process.sentinel for process in self.__processes], timeout=self.__restart_delay)
+            for number, process in enumerate(self.__processes):
+                if not self.__stopping and not process.is_alive():
+                    logger.warning("Consumer process %s exited with code %s", process.pid, process.exitcode)
+                    process.close()
+                    # process which crashes on start isn't restarted in a busy loop
+                    time.sleep(self.__restart_delay)
+                    self.__processes[number] = self.__start(number)
+
+        self.__shutdown()
+
+    @staticmethod
+    def __start(number: int) -> Process:
+        process = Process(target=run_consumer, args=(number,), name=f"consumer-{number}")
+        process.start()
+        logger.info("Start consumer process %s", process.pid)
+        return process
+
+    def __stop(self, signum: int, frame: FrameType | None) -> None:
+        logger.info("Stop consumer processes by signal %s", signum)
+        self.__stopping = True
+
+    def __pass_signal(self, signum: int, frame: FrameType | None) -> None:
+        for process in self.__processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    def __shutdown(self) -> None:
+        processes = [process for process in self.__processes if process.is_alive()]
+        for process in processes:
+            process.terminate()
+
+        deadline = time.monotonic() + self.__shutdown_timeout
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning("Kill consumer process %s", process.pid)
+                process.kill()
+                process.join()
@@ -2,77 +2,377 @@ import asyncio
 import logging
 import re
 import time
-from asyncio import Event, ensure_future, gather, sleep
+from asyncio import Event, Queue, ensure_future, gather, sleep, wait_for
+from contextlib import suppress
 
-from aiohttp import ClientError, ClientSession, ClientTimeout
-from asyncpg import InterfaceError, Pool, PostgresError
+from aiohttp import ClientError, ClientResponse, ClientSession
+from asyncpg import Connection, InterfaceError, Pool, PostgresError, Record
 
-from aiven.db.crud import TaskResult, finish_task, get_next_task, set_result
+from aiven.consumer.http import RequestTimings, get_http_session
+from aiven.consumer.matcher import StreamMatcher, decode_results, get_bytes_regex, get_decoder, regex_cache
+from aiven.consumer.prefilter import Prefilter, is_utf8
+from aiven.consumer.reaper import start_reaper
+from aiven.consumer.regex_pool import RegexPool, RegexTimeoutError
+from aiven.consumer.sink import ResultSink
+from aiven.db.crud import TASK_CREATED_CHANNEL, TaskResult, get_next_tasks
 from aiven.db.db import get_db_pool
+from aiven.metrics import (
+    fetch_duration,
+    fetches_in_flight,
+    get_status_class,
+    queue_size,
+    start_metrics_server,
+    tasks_claimed,
+    tasks_fetched,
+)
 from conf.config_consumer import settings
 
 logger = logging.getLogger(__name__)
 
+HEAD_NOT_ALLOWED_STATUSES = (405, 501)
 
-async def fetch_url(session: ClientSession, task_id: int, url: str, regex: str | None) -> TaskResult:
-    logger.info("fetch url: %s, regex: %s", (url, regex))
-    start_time = time.time()
+
+def get_error_text(exception: Exception) -> str:
+    return f"{type(exception).__name__}: {str(exception)}"
+
+
+async def match_body(
+    resp: ClientResponse,
+    regexes: list[str | None],
+    regex_pool: RegexPool | None = None,
+    prefilter: Prefilter | None = None,
+) -> list[tuple[list[str], str]]:
+    """Reads body once and matches every regex against it. Returns matches and error text of every regex."""
+    body = await resp.read()
+    encoding = resp.charset or "utf-8"
+    text = None
+    candidates = None
+    if prefilter and any(regexes) and is_utf8(resp.get_encoding()):
+        # hyperscan needs a valid utf-8
+        with suppress(UnicodeDecodeError):
+            text = body.decode("utf-8")
+            candidates = prefilter.get_candidates(regexes, body)
+
+    results = []
+    for index, regex in enumerate(regexes):
+        if not regex or (candidates is not None and index not in candidates):
+            results.append(([], ""))
+            continue
+
+        bytes_regex = get_bytes_regex(regex, encoding) if settings.BYTES_REGEX else None
+        try:
+            if bytes_regex and regex_pool:
+                regex_result = decode_results(await regex_pool.findall(bytes_regex, body), encoding)
+            elif bytes_regex:
+                # without decoding (and charset detection) of body
+                regex_result = decode_results(regex_cache.get(bytes_regex).findall(body), encoding)
+            elif regex_pool:
+                # body is decoded in process of pool too
+                regex_result = await regex_pool.findall(regex, body, resp.get_encoding())
+            else:
+                text = await resp.text() if text is None else text
+                regex_result = regex_cache.get(regex).findall(text)
+        except (RegexTimeoutError, re.error) as e:
+            results.append(([], get_error_text(e)))
+        else:
+            results.append((regex_result, ""))
+
+    return results
+
+
+async def match_stream(resp: ClientResponse, regexes: list[str | None]) -> tuple[list[tuple[list[str], str]], str]:
+    """Reads body by chunks (up to MAX_BODY_SIZE bytes) and matches regexes without buffering whole body.
+
+    Returns matches and error text of every regex, and error text of reading of body.
+    """
+    encoding = resp.charset or "utf-8"
+    matchers: list[StreamMatcher | None] = []
+    bytes_regexes: list[bytes | None] = []
+    error_texts: list[str] = []
+    for regex in regexes:
+        bytes_regex = get_bytes_regex(regex, encoding) if regex and settings.BYTES_REGEX else None
+        matcher = None
+        regex_error_text = ""
+        try:
+            if regex:
+                matcher = StreamMatcher(bytes_regex or regex, settings.STREAM_OVERLAP_SIZE, settings.FIND_ALL_MATCHES)
+        except re.error as e:
+            regex_error_text = get_error_text(e)
+
+        bytes_regexes.append(bytes_regex)
+        matchers.append(matcher)
+        error_texts.append(regex_error_text)
+
+    error_text = ""
+    if any(matchers):
+        error_text = await feed_matchers(resp, matchers, bytes_regexes, encoding)
+
+    results = []
+    for matcher, bytes_regex, regex_error_text in zip(matchers, bytes_regexes, error_texts):
+        regex_result = matcher.close() if matcher else []
+        results.append((decode_results(regex_result, encoding) if bytes_regex else regex_result, regex_error_text))
+
+    return results, error_text
+
+
+async def feed_matchers(
+    resp: ClientResponse,
+    matchers: list[StreamMatcher | None],
+    bytes_regexes: list[bytes | None],
+    encoding: str,
+) -> str:
+    # raw chunks are matched by bytes regexes, for str regexes every chunk is decoded once
+    decoder = get_decoder(encoding)
+    active = [(matcher, bool(bytes_regex)) for matcher, bytes_regex in zip(matchers, bytes_regexes) if matcher]
+
+    def feed(chunk: bytes, final: bool = False) -> None:
+        text = decoder.decode(chunk, final) if not all(is_bytes for _, is_bytes in active) else ""
+        for matcher, is_bytes in active:
+            matcher.feed(chunk if is_bytes else text)
+
+    body_size = 0
+    async for chunk in resp.content.iter_chunked(settings.STREAM_CHUNK_SIZE):
+        body_size += len(chunk)
+        if body_size > settings.MAX_BODY_SIZE:
+            rest_size = len(chunk) - (body_size - settings.MAX_BODY_SIZE)
+            feed(chunk[:rest_size], final=True)
+            return f"BodyTooLarge: body is bigger than {settings.MAX_BODY_SIZE} bytes"
+
+        feed(chunk)
+        active = [(matcher, is_bytes) for matcher, is_bytes in active if not matcher.done]
+        if not active:
+            return ""
+
+    feed(b"", final=True)
+    return ""
+
+
+async def send_request(session: ClientSession, url: str, check_mode: str, timings: RequestTimings) -> ClientResponse:
+    if check_mode == "head":
+        resp = await session.head(url, allow_redirects=True, trace_request_ctx=timings)
+        if resp.status not in HEAD_NOT_ALLOWED_STATUSES:
+            return resp
+
+        # site doesn't support HEAD, status is checked by GET without reading body
+        resp.release()
+
+    return await session.get(url, allow_redirects=True, trace_request_ctx=timings)
+
+
+async def skip_body(resp: ClientResponse) -> None:
+    """Small body is read, so connection is reused. Connection with big body is closed without reading it."""
+    if resp.content_length is not None and resp.content_length <= settings.STATUS_ONLY_MAX_READ_SIZE:
+        await resp.read()
+    else:
+        resp.close()
+
+
+async def fetch_url(
+    session: ClientSession,
+    task_id: int,
+    url: str,
+    regex: str | None,
+    regex_pool: RegexPool | None = None,
+    claimed_at: float | None = None,
+    check_mode: str = "full",
+    prefilter: Prefilter | None = None,
+) -> TaskResult:
+    (result,) = await fetch_url_tasks(session, url, [(task_id, regex)], regex_pool, claimed_at, check_mode, prefilter)
+    return result
+
+
+async def fetch_url_tasks(
+    session: ClientSession,
+    url: str,
+    tasks: list[tuple[int, str | None]],
+    regex_pool: RegexPool | None = None,
+    claimed_at: float | None = None,
+    check_mode: str = "full",
+    prefilter: Prefilter | None = None,
+) -> list[TaskResult]:
+    """Fetches url once and matches regexes of all its tasks against the same body. Returns result of every task."""
+    regexes = [regex for _, regex in tasks]
+    logger.info("fetch url: %s, regexes: %s", (url, regexes))
+    start_time = time.monotonic()
     status_code = 0
     error_text = ""
-    regex_is_found = False
-    regex_result_str = ""
+    regex_results: list[list[str]] = [[] for _ in tasks]
+    error_texts = ["" for _ in tasks]
+    timings = RequestTimings()
+    download_time = None
+    fetches_in_flight.inc()
 
     try:
-        async with session.get(url, allow_redirects=True) as resp:
+        async with await send_request(session, url, check_mode, timings) as resp:
+            headers_received_at = time.monotonic()
             status_code = resp.status
             resp.raise_for_status()
-            resp_text = await resp.text()
-            if regex:
-                regex_result = re.findall(regex, resp_text)
-                if regex_result:
-                    regex_is_found = True
+            if check_mode != "full":
+                await skip_body(resp)
+            else:
+                if settings.STREAM_BODY:
+                    matches, error_text = await match_stream(resp, regexes)
+                else:
+                    matches = await match_body(resp, regexes, regex_pool, prefilter)
 
-                regex_result_str = "; ".join(regex_result)
+                regex_results = [regex_result for regex_result, _ in matches]
+                error_texts = [regex_error_text for _, regex_error_text in matches]
+
+            download_time = time.monotonic() - headers_received_at
     except (ClientError, TimeoutError) as e:
-        error_text = f"{type(e).__name__}: {str(e)}"
+        error_text = get_error_text(e)
+    finally:
+        fetches_in_flight.dec()
 
-    end_time = time.time()
+    end_time = time.monotonic()
     response_time = end_time - start_time
-    return TaskResult(
-        task_id=task_id,
-        url=url,
-        response_time=response_time,
-        status_code=status_code,
-        error_text=error_text,
-        regex_is_found=regex_is_found,
-        regex_result=regex_result_str,
-    )
-
-
-async def start_worker(stop_event: Event, pool: Pool) -> None:
-    timeout = ClientTimeout(total=settings.HTTP_REQUEST_TIMEOUT)
-    async with ClientSession(timeout=timeout) as session:
+    status_class = get_status_class(status_code)
+    fetch_duration.observe(response_time, status_class)
+    tasks_fetched.inc(status_class, amount=len(tasks))
+    return [
+        TaskResult(
+            task_id=task_id,
+            url=url,
+            response_time=response_time,
+            status_code=status_code,
+            error_text=error_text or regex_error_text,
+            regex_is_found=bool(regex_result),
+            regex_result="; ".join(regex_result),
+            queue_time=start_time - claimed_at if claimed_at is not None else None,
+            connection_wait_time=timings.connection_wait_time,
+            dns_time=timings.dns_time,
+            connect_time=timings.connect_time,
+            first_byte_time=timings.first_byte_time,
+            download_time=download_time,
+        )
+        for (task_id, _), regex_result, regex_error_text in zip(tasks, regex_results, error_texts)
+    ]
+
+
+def group_tasks(tasks: list[Record]) -> list[tuple[str, str, list[tuple[int, str | None]]]]:
+    """Groups tasks of the same url, so url is fetched once for all its regexes."""
+    groups: dict[tuple[str, str], list[tuple[int, str | None]]] = {}
+    for task in tasks:
+        groups.setdefault((task["url"], task["check_mode"]), []).append((task["id"], task["regex"]))
+
+    return [(url, check_mode, url_tasks) for (url, check_mode), url_tasks in groups.items()]
+
+
+def compile_regexes(tasks: list[Record]) -> None:
+    """Regexes of claimed tasks are compiled before fetching, so workers get them from cache."""
+    for task in tasks:
+        if not task["regex"]:
+            continue
+
         try:
-            async with pool.acquire() as connection:
-                while not stop_event.is_set():
-                    async with connection.transaction():
-                        next_task = await get_next_task(connection)
-                        if next_task:
-                            task_id, url, regex = next_task
-                            logger.info("Get new task. url: %s, regex: %s", (url, regex))
-                            result = await fetch_url(session, task_id, url, regex)
-                            await finish_task(connection, task_id)
-                            await set_result(connection, result)
-
-                    if not next_task:
-                        await sleep(settings.SLEEP_WITHOUT_TASK)
+            regex_cache.get(task["regex"])
+            if settings.BYTES_REGEX and (bytes_regex := get_bytes_regex(task["regex"], "utf-8")):
+                regex_cache.get(bytes_regex)
+        except re.error:
+            logger.warning("Invalid regex: %s", task["regex"])
+
+    logger.debug("Regex cache: size %s, hits %s, misses %s", len(regex_cache), regex_cache.hits, regex_cache.misses)
+
+
+async def wait_event(event: Event, timeout: float) -> bool:
+    try:
+        await wait_for(event.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        return False
+
+    return True
+
+
+async def listen_tasks(stop_event: Event, pool: Pool, tasks_created: Event) -> None:
+    def on_task_created(connection: Connection, pid: int, channel: str, payload: str) -> None:
+        logger.debug("%s new tasks are created", payload)
+        tasks_created.set()
 
+    while not stop_event.is_set():
+        try:
+            async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
+                await connection.add_listener(TASK_CREATED_CHANNEL, on_task_created)
+                try:
+                    while not stop_event.is_set() and not connection.is_closed():
+                        await wait_event(stop_event, settings.SLEEP_WITHOUT_TASK)
+                finally:
+                    await connection.remove_listener(TASK_CREATED_CHANNEL, on_task_created)
         except (PostgresError, InterfaceError, asyncio.TimeoutError):
-            logger.exception("Exception in consumer")
-            # TODO: Circuit breaker design pattern
-            # (https://en.wikipedia.org/wiki/Circuit_breaker_design_pattern#:~:text=Circuit%20breaker%20is%20a%20design,failure%20or%20unexpected%20system%20difficulties.)
+            logger.exception("Can't listen for new tasks")
             await sleep(settings.SLEEP_AFTER_EXCEPTION)
-            # TODO: add slack/email notification
+
+
+async def claim_tasks(
+    stop_event: Event,
+    pool: Pool,
+    queue: Queue,
+    queue_is_low: Event,
+    tasks_created: Event,
+    claimer_done: Event,
+) -> None:
+    try:
+        while not stop_event.is_set():
+            # cleared before claiming, so tasks created during claiming wake up claimer again
+            tasks_created.clear()
+            try:
+                async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
+                    limit = min(settings.BATCH_SIZE, queue.maxsize - queue.qsize())
+                    next_tasks = await get_next_tasks(connection, limit, settings.LEASE_TIME)
+            except (PostgresError, InterfaceError, asyncio.TimeoutError):
+                logger.exception("Exception in consumer")
+                # TODO: Circuit breaker design pattern
+                # (https://en.wikipedia.org/wiki/Circuit_breaker_design_pattern#:~:text=Circuit%20breaker%20is%20a%20design,failure%20or%20unexpected%20system%20difficulties.)
+                await sleep(settings.SLEEP_AFTER_EXCEPTION)
+                # TODO: add slack/email notification
+                continue
+
+            if not next_tasks:
+                # without notification (or with LISTEN_FOR_TASKS disabled) it's a plain polling
+                await wait_event(tasks_created, settings.SLEEP_WITHOUT_TASK)
+                continue
+
+            claimed_at = time.monotonic()
+            # all tasks of batch are claimed at the same time of db, it identifies the claim when result is written
+            db_claimed_at = next_tasks[0]["claimed_at"]
+            logger.info("Claim %s new tasks", len(next_tasks))
+            tasks_claimed.inc(amount=len(next_tasks))
+            compile_regexes(next_tasks)
+            # due tasks of the same url share one fetch, every regex is matched against the same body
+            for url, check_mode, url_tasks in group_tasks(next_tasks):
+                queue.put_nowait((url, check_mode, url_tasks, claimed_at, db_claimed_at))
+
+            # refill only when fetch workers have drained the queue down to the threshold
+            while queue.qsize() > settings.QUEUE_REFILL_THRESHOLD and not stop_event.is_set():
+                queue_is_low.clear()
+                await wait_event(queue_is_low, settings.SLEEP_WITHOUT_TASK)
+    finally:
+        # workers drain the queue until the last claimed batch is put into it
+        claimer_done.set()
+
+
+async def start_worker(
+    claimer_done: Event,
+    session: ClientSession,
+    queue: Queue,
+    queue_is_low: Event,
+    sink: ResultSink,
+    regex_pool: RegexPool | None = None,
+    prefilter: Prefilter | None = None,
+) -> None:
+    # claimed tasks are already marked as started, so the queue is drained after the last claim before stopping
+    while not (claimer_done.is_set() and queue.empty()):
+        try:
+            next_tasks = await wait_for(queue.get(), timeout=settings.SLEEP_WITHOUT_TASK)
+        except asyncio.TimeoutError:
+            continue
+
+        if queue.qsize() <= settings.QUEUE_REFILL_THRESHOLD:
+            queue_is_low.set()
+
+        url, check_mode, url_tasks, claimed_at, db_claimed_at = next_tasks
+        logger.info("Get %s new tasks. url: %s", len(url_tasks), url)
+        for result in await fetch_url_tasks(session, url, url_tasks, regex_pool, claimed_at, check_mode, prefilter):
+            await sink.put(result, db_claimed_at)
 
 
 async def start_workers(max_workers: int, stop_event: Event | None = None) -> None:
@@ -81,8 +381,53 @@ async def start_workers(max_workers: int, stop_event: Event | None = None) -> No
         stop_event = Event()
 
     try:
-        async with get_db_pool() as pool:
-            tasks = [ensure_future(start_worker(stop_event, pool)) for _ in range(max_workers)]
+        async with get_db_pool() as pool, get_http_session() as session:
+            queue = Queue(maxsize=settings.QUEUE_SIZE)
+            queue_is_low = Event()
+            sink = ResultSink(pool)
+            # sink stops after workers, so results of all claimed tasks are written
+            sink_stop_event = Event()
+            sink_task = ensure_future(sink.run(sink_stop_event))
+            tasks_created = Event()
+            claimer_done = Event()
+            tasks = [ensure_future(claim_tasks(stop_event, pool, queue, queue_is_low, tasks_created, claimer_done))]
+            queue_size.set_function(queue.qsize)
+            if settings.METRICS_ENABLED:
+                tasks.append(
+                    ensure_future(
+                        start_metrics_server(
+                            stop_event,
+                            pool,
+                            settings.METRICS_HOST,
+                            settings.METRICS_PORT,
+                            settings.DB_POOL_ACQUIRE_TIMEOUT,
+                        ),
+                    ),
+                )
+
+            if settings.LISTEN_FOR_TASKS:
+                tasks.append(ensure_future(listen_tasks(stop_event, pool, tasks_created)))
+
+            if settings.REAPER_ENABLED:
+                tasks.append(ensure_future(start_reaper(stop_event, pool)))
+
+            regex_pool = None
+            if settings.REGEX_PROCESSES:
+                regex_pool = RegexPool(
+                    settings.REGEX_PROCESSES,
+                    settings.REGEX_TIMEOUT,
+                    settings.REGEX_SHARED_MEMORY_SIZE,
+                )
+
+            prefilter = Prefilter(settings.REGEX_CACHE_SIZE) if settings.REGEX_ENGINE == "hyperscan" else None
+            tasks += [
+                ensure_future(start_worker(claimer_done, session, queue, queue_is_low, sink, regex_pool, prefilter))
+                for _ in range(max_workers)
+            ]
             await gather(*tasks)
+            sink_stop_event.set()
+            await sink_task
+            if regex_pool:
+                regex_pool.shutdown()
     except (PostgresError, InterfaceError, asyncio.TimeoutError):
         logger.exception("Can't start consumer's workers")
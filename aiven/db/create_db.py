@@ -2,9 +2,21 @@
 
 import asyncio
 
+from aiven.db.crud import CHECK_MODES, TASK_CREATED_CHANNEL, URL_CHANGED_CHANNEL
 from aiven.db.db import get_db_connection
+from aiven.db.partitions import check_partitioned, create_partitions
 from conf.config import settings
 
+CHECK_MODES_SQL = ", ".join(f"'{check_mode}'" for check_mode in CHECK_MODES)
+
+# columns added after the first release, tables of existing databases get them by `ALTER TABLE`
+MIGRATE_URL_TABLE = f"""
+ALTER TABLE url ADD COLUMN IF NOT EXISTS next_run_at TIMESTAMPTZ;
+UPDATE url SET next_run_at = COALESCE(last_run_at + INTERVAL '1 sec' * period, NOW()) WHERE next_run_at IS NULL;
+ALTER TABLE url ALTER COLUMN next_run_at SET DEFAULT NOW(), ALTER COLUMN next_run_at SET NOT NULL;
+ALTER TABLE url ADD COLUMN IF NOT EXISTS check_mode VARCHAR(16) NOT NULL DEFAULT 'full' CHECK (check_mode IN ({CHECK_MODES_SQL}));
+"""
+
 CREATE_URL_TABLE = f"""
 CREATE TABLE IF NOT EXISTS url
 (
@@ -14,52 +26,183 @@ CREATE TABLE IF NOT EXISTS url
     period         SMALLINT NOT NULL DEFAULT {settings.MIN_PERIOD} CHECK (period >= {settings.MIN_PERIOD} AND period <= {settings.MAX_PERIOD}),
     created_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     last_run_at    TIMESTAMPTZ,
+    next_run_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    check_mode     VARCHAR(16) NOT NULL DEFAULT 'full' CHECK (check_mode IN ({CHECK_MODES_SQL})),
     UNIQUE NULLS NOT DISTINCT (url, regex)
 );
-
+{MIGRATE_URL_TABLE}
 CREATE INDEX IF NOT EXISTS url__url__idx ON url (url);
+CREATE INDEX IF NOT EXISTS url__next_run_at__idx ON url (next_run_at);
 """
 
 
-CREATE_TASK_QUEUE_TABLE = """
-CREATE TABLE IF NOT EXISTS task
-(
-    id          SERIAL PRIMARY KEY,
+TASK_QUEUE_COLUMNS = """
+    id          SERIAL,
     created_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     status      INTEGER NOT NULL DEFAULT 0,
     url         VARCHAR(255) NOT NULL,
-    regex       VARCHAR(255)
-);
+    regex       VARCHAR(255),
+    claimed_at  TIMESTAMPTZ,
+    lease_until TIMESTAMPTZ,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    check_mode  VARCHAR(16) NOT NULL DEFAULT 'full'"""
+
+MIGRATE_TASK_QUEUE_TABLE = """
+ALTER TABLE task
+    ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS lease_until TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS check_mode VARCHAR(16) NOT NULL DEFAULT 'full';
+"""
 
+TASK_QUEUE_INDEXES = """
 CREATE INDEX IF NOT EXISTS task__url__idx ON task (url);
+CREATE INDEX IF NOT EXISTS task__pending__idx ON task (id) WHERE status = 0;
+CREATE INDEX IF NOT EXISTS task__lease_until__idx ON task (lease_until) WHERE status = 1;
+"""
+
+CREATE_TASK_QUEUE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS task
+({TASK_QUEUE_COLUMNS},
+    PRIMARY KEY (id)
+);
+{MIGRATE_TASK_QUEUE_TABLE}{TASK_QUEUE_INDEXES}"""
+
+# finished partitions are dropped as a whole, default partition catches rows without partition
+CREATE_PARTITIONED_TASK_QUEUE_TABLE = f"""
+CREATE TABLE IF NOT EXISTS task
+({TASK_QUEUE_COLUMNS},
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS task_default PARTITION OF task DEFAULT;
+{MIGRATE_TASK_QUEUE_TABLE}{TASK_QUEUE_INDEXES}"""
+
+
+TASK_RESULT_COLUMNS = """
+    id                      SERIAL,
+    task_id                 INT,
+    url                     VARCHAR(255) NOT NULL,
+    timestamp               TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    response_time           FLOAT,
+    status_code             SMALLINT NOT NULL DEFAULT 0,
+    error_text              TEXT,
+    regex_is_found          BOOLEAN DEFAULT TRUE,
+    regex_result            TEXT,
+    queue_time              FLOAT,
+    connection_wait_time    FLOAT,
+    dns_time                FLOAT,
+    connect_time            FLOAT,
+    first_byte_time         FLOAT,
+    download_time           FLOAT"""
+
+MIGRATE_TASK_RESULT_TABLE = """
+ALTER TABLE task_result
+    ADD COLUMN IF NOT EXISTS queue_time FLOAT,
+    ADD COLUMN IF NOT EXISTS connection_wait_time FLOAT,
+    ADD COLUMN IF NOT EXISTS dns_time FLOAT,
+    ADD COLUMN IF NOT EXISTS connect_time FLOAT,
+    ADD COLUMN IF NOT EXISTS first_byte_time FLOAT,
+    ADD COLUMN IF NOT EXISTS download_time FLOAT;
 """
 
+TASK_RESULT_INDEXES = """
+CREATE INDEX IF NOT EXISTS task_result__url__timestamp__idx ON task_result (url, timestamp);
+CREATE INDEX IF NOT EXISTS task_result__timestamp__idx ON task_result USING BRIN (timestamp);
+"""
 
-CREATE_TASK_RESULT_TABLE = """
+CREATE_TASK_RESULT_TABLE = f"""
 CREATE TABLE IF NOT EXISTS task_result
-(
-    id              SERIAL PRIMARY KEY,
-    task_id         INT,
-    url             VARCHAR(255) NOT NULL,
-    timestamp       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    response_time   FLOAT,
-    status_code     SMALLINT NOT NULL DEFAULT 0,
-    error_text      TEXT,
-    regex_is_found  BOOLEAN DEFAULT TRUE,
-    regex_result    TEXT,
-    CONSTRAINT fk_task FOREIGN KEY(task_id) REFERENCES task(id) ON DELETE CASCADE
+({TASK_RESULT_COLUMNS},
+    PRIMARY KEY (id)
 );
+{MIGRATE_TASK_RESULT_TABLE}{TASK_RESULT_INDEXES}"""
 
-CREATE INDEX IF NOT EXISTS task_result__url__idx ON task_result (url);
+CREATE_PARTITIONED_TASK_RESULT_TABLE = f"""
+CREATE TABLE IF NOT EXISTS task_result
+({TASK_RESULT_COLUMNS},
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE IF NOT EXISTS task_result_default PARTITION OF task_result DEFAULT;
+{MIGRATE_TASK_RESULT_TABLE}{TASK_RESULT_INDEXES}"""
+
+# partitioned table `task` has no unique index on `id` only, so foreign key can't reference it
+ADD_TASK_RESULT_FOREIGN_KEY = """
+DO $$
+BEGIN
+    ALTER TABLE task_result
+        ADD CONSTRAINT fk_task FOREIGN KEY(task_id) REFERENCES task(id) ON DELETE CASCADE;
+EXCEPTION
+    WHEN duplicate_object THEN NULL;
+END;
+$$;
+"""
+
+CREATE_URL_CHANGED_TRIGGER = f"""
+CREATE OR REPLACE FUNCTION notify_url_changed() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('{URL_CHANGED_CHANNEL}', json_build_object('op', TG_OP, 'id', OLD.id)::text);
+    ELSE
+        PERFORM pg_notify('{URL_CHANGED_CHANNEL}', json_build_object('op', TG_OP, 'id', NEW.id)::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER url__changed__trigger
+    AFTER INSERT OR DELETE OR UPDATE OF url, regex, period ON url
+    FOR EACH ROW EXECUTE FUNCTION notify_url_changed();
+"""
+
+CREATE_TASK_CREATED_TRIGGER = f"""
+CREATE OR REPLACE FUNCTION notify_task_created() RETURNS TRIGGER AS $$
+DECLARE
+    amount_of_tasks INTEGER;
+BEGIN
+    SELECT count(*) INTO amount_of_tasks FROM new_tasks;
+    IF amount_of_tasks > 0 THEN
+        PERFORM pg_notify('{TASK_CREATED_CHANNEL}', amount_of_tasks::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER task__created__trigger
+    AFTER INSERT ON task
+    REFERENCING NEW TABLE AS new_tasks
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_task_created();
 """
 
 
 async def create_tables() -> None:
     async with get_db_connection() as connection:
+        # `CREATE TABLE IF NOT EXISTS ... PARTITION BY` doesn't touch existing table, so nothing is created
+        if settings.TASK_PARTITIONING:
+            await check_partitioned(connection, "task")
+        if settings.RESULT_PARTITIONING:
+            await check_partitioned(connection, "task_result")
+
         async with connection.transaction():
             await connection.execute(CREATE_URL_TABLE)
-            await connection.execute(CREATE_TASK_QUEUE_TABLE)
-            await connection.execute(CREATE_TASK_RESULT_TABLE)
+            if settings.TASK_PARTITIONING:
+                await connection.execute(CREATE_PARTITIONED_TASK_QUEUE_TABLE)
+                await create_partitions(connection, "task", settings.PARTITIONS_AHEAD)
+            else:
+                await connection.execute(CREATE_TASK_QUEUE_TABLE)
+
+            if settings.RESULT_PARTITIONING:
+                await connection.execute(CREATE_PARTITIONED_TASK_RESULT_TABLE)
+                await create_partitions(connection, "task_result", settings.PARTITIONS_AHEAD)
+            else:
+                await connection.execute(CREATE_TASK_RESULT_TABLE)
+
+            if not settings.TASK_PARTITIONING:
+                await connection.execute(ADD_TASK_RESULT_FOREIGN_KEY)
+
+            await connection.execute(CREATE_URL_CHANGED_TRIGGER)
+            await connection.execute(CREATE_TASK_CREATED_TRIGGER)
 
 
 async def main() -> None:
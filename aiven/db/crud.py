@@ -1,29 +1,127 @@
-from dataclasses import astuple, dataclass
-from datetime import datetime, timezone
+from dataclasses import astuple, dataclass, fields
+from datetime import datetime
 
 from asyncpg import Connection, Record
 
+from aiven.metrics import observe_statement
+
+CHECK_MODES = ("full", "status-only", "head")
+
 CREATE_NEW_URL = """
-INSERT INTO url (url, period, regex) VALUES ($1, $2, $3) RETURNING id;
+INSERT INTO url (url, period, regex, check_mode) VALUES ($1, $2, $3, $4) RETURNING id;
 """
 
 GET_NEXT_URL = """
-SELECT id, url, regex FROM url
-    WHERE last_run_at IS NULL OR last_run_at + INTERVAL '1 sec' * url.period < localtimestamp
-    ORDER BY id
+SELECT id, url, regex, check_mode FROM url
+    WHERE next_run_at <= NOW()
+    ORDER BY next_run_at
     LIMIT 1
     for update skip locked;
 """
 
+# rows of url locked by GET_NEXT_URL are enqueued together, as in ENQUEUE_DUE_URLS
+ENQUEUE_URL_GROUP = """
+WITH grouped_urls AS (
+    SELECT id, url, regex, check_mode FROM url
+    WHERE url.url = $1 AND url.check_mode = $2
+    FOR UPDATE skip locked
+), scheduled_urls AS (
+    UPDATE url
+    SET
+        last_run_at = NOW(),
+        next_run_at = GREATEST(LEAST(url.next_run_at, NOW()) + INTERVAL '1 sec' * url.period, NOW())
+    FROM grouped_urls
+    WHERE url.id = grouped_urls.id
+), created_tasks AS (
+    INSERT INTO task (url, regex, check_mode)
+    SELECT url, regex, check_mode FROM grouped_urls
+    RETURNING id
+)
+SELECT count(*) FROM created_tasks;
+"""
+
+# every row of a due url (with the same check mode) is enqueued, so consumer fetches url once for all its regexes,
+# rows enqueued before their time are moved to the same phase as the due one
+ENQUEUE_DUE_URLS = """
+WITH due_urls AS (
+    SELECT url, check_mode FROM url
+    WHERE next_run_at <= NOW()
+    ORDER BY next_run_at
+    LIMIT $1
+    FOR UPDATE skip locked
+), grouped_urls AS (
+    SELECT id, url, regex, check_mode FROM url
+    WHERE (url.url, url.check_mode) IN (SELECT url, check_mode FROM due_urls)
+    FOR UPDATE skip locked
+), scheduled_urls AS (
+    UPDATE url
+    SET
+        last_run_at = NOW(),
+        next_run_at = GREATEST(LEAST(url.next_run_at, NOW()) + INTERVAL '1 sec' * url.period, NOW())
+    FROM grouped_urls
+    WHERE url.id = grouped_urls.id
+), created_tasks AS (
+    INSERT INTO task (url, regex, check_mode)
+    SELECT url, regex, check_mode FROM grouped_urls
+    RETURNING id
+)
+SELECT count(*) FROM created_tasks;
+"""
+
+URL_CHANGED_CHANNEL = "url_changed"
+
+GET_URLS_SCHEDULE = """
+SELECT id, EXTRACT(EPOCH FROM next_run_at - NOW())::float AS delay FROM url;
+"""
+
+GET_URLS_SCHEDULE_BY_IDS = """
+SELECT id, EXTRACT(EPOCH FROM next_run_at - NOW())::float AS delay FROM url
+WHERE id = ANY($1::int[]);
+"""
+
+# urls of the same group are returned too, they are rescheduled as well,
+# every row has amount of created tasks, urls which are locked or not due anymore are skipped
+ENQUEUE_URLS = """
+WITH due_urls AS (
+    SELECT url, check_mode FROM url
+    WHERE id = ANY($1::int[]) AND next_run_at <= NOW()
+    FOR UPDATE skip locked
+), grouped_urls AS (
+    SELECT id, url, regex, check_mode FROM url
+    WHERE (url.url, url.check_mode) IN (SELECT url, check_mode FROM due_urls)
+    FOR UPDATE skip locked
+), scheduled_urls AS (
+    UPDATE url
+    SET
+        last_run_at = NOW(),
+        next_run_at = GREATEST(LEAST(url.next_run_at, NOW()) + INTERVAL '1 sec' * url.period, NOW())
+    FROM grouped_urls
+    WHERE url.id = grouped_urls.id
+    RETURNING url.id, url.next_run_at
+), created_tasks AS (
+    INSERT INTO task (url, regex, check_mode)
+    SELECT url, regex, check_mode FROM grouped_urls
+    RETURNING id
+)
+SELECT
+    url.id,
+    EXTRACT(EPOCH FROM COALESCE(scheduled_urls.next_run_at, url.next_run_at) - NOW())::float AS delay,
+    (SELECT count(*) FROM created_tasks) AS amount_of_tasks
+FROM url
+LEFT JOIN scheduled_urls ON scheduled_urls.id = url.id
+WHERE url.id = ANY($1::int[]) OR scheduled_urls.id IS NOT NULL;
+"""
 
 CREATE_NEXT_TASK = """
-INSERT INTO task (url, regex) VALUES ($1, $2) RETURNING id;
+INSERT INTO task (url, regex, check_mode) VALUES ($1, $2, $3) RETURNING id;
 """
 
 
+TASK_CREATED_CHANNEL = "task_created"
+
 GET_NEXT_TASK = """
 WITH next_task AS (
-    SELECT id, url, regex FROM task
+    SELECT id FROM task
     WHERE status = 0
     ORDER BY id
     LIMIT 1
@@ -31,29 +129,93 @@ WITH next_task AS (
 )
 UPDATE task
 SET
-    status = 1
+    status = 1,
+    claimed_at = NOW(),
+    attempts = task.attempts + 1,
+    lease_until = NOW() + INTERVAL '1 sec' * $1
 FROM next_task
 WHERE task.id = next_task.id
-RETURNING task.id, task.url, task.regex;
+RETURNING task.id, task.url, task.regex, task.check_mode;
+"""
+
+GET_NEXT_TASKS = """
+WITH next_tasks AS (
+    SELECT id FROM task
+    WHERE status = 0
+    ORDER BY id
+    LIMIT $1
+    FOR UPDATE skip locked
+), claimed_tasks AS (
+    UPDATE task
+    SET
+        status = 1,
+        claimed_at = NOW(),
+        attempts = task.attempts + 1,
+        lease_until = NOW() + INTERVAL '1 sec' * $2
+    FROM next_tasks
+    WHERE task.id = next_tasks.id
+    RETURNING task.id, task.url, task.regex, task.check_mode, task.claimed_at
+)
+SELECT id, url, regex, check_mode, claimed_at FROM claimed_tasks
+ORDER BY id;
+"""
+
+REAP_EXPIRED_TASKS = """
+WITH expired_tasks AS (
+    SELECT id FROM task
+    WHERE status = 1 AND lease_until < NOW()
+    ORDER BY lease_until
+    LIMIT $1
+    FOR UPDATE skip locked
+), reaped_tasks AS (
+    UPDATE task
+    SET
+        status = CASE WHEN task.attempts >= $2 THEN 3 ELSE 0 END,
+        lease_until = NULL
+    FROM expired_tasks
+    WHERE task.id = expired_tasks.id
+    RETURNING task.id, task.url, task.status
+), failed_results AS (
+    INSERT INTO task_result (task_id, url, error_text, regex_is_found)
+    SELECT id, url, $3, FALSE FROM reaped_tasks
+    WHERE status = 3
+)
+SELECT id, status FROM reaped_tasks
+ORDER BY id;
 """
 
 FINISH_TASK = """
 UPDATE task
 SET
-    status = 2
+    status = 2,
+    lease_until = NULL
 WHERE id = $1;
 """
 
+# task is finished only by the claim which is still its current one: task which lease is expired can be failed
+# by reaper or claimed again, then late result of the previous claim is dropped
+FINISH_TASKS = """
+UPDATE task
+SET
+    status = 2,
+    lease_until = NULL
+FROM unnest($1::int[], $2::timestamptz[]) AS claim(id, claimed_at)
+WHERE task.id = claim.id AND task.status = 1 AND task.claimed_at = claim.claimed_at
+RETURNING task.id;
+"""
+
 
 SET_RESULT = """
 INSERT INTO task_result
-    (task_id, url, status_code, response_time, error_text, regex_is_found, regex_result)
-VALUES ($1, $2, $3, $4, $5, $6, $7) RETURNING id;
+    (task_id, url, status_code, response_time, error_text, regex_is_found, regex_result,
+    queue_time, connection_wait_time, dns_time, connect_time, first_byte_time, download_time)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13) RETURNING id;
 """
 
 UPDATE_LAST_RUN_AT = """
 UPDATE url SET
-    last_run_at = $2
+    last_run_at = NOW(),
+    next_run_at = GREATEST(next_run_at + INTERVAL '1 sec' * period, NOW())
 WHERE id = $1
 """
 
@@ -78,40 +240,113 @@ class TaskResult:
     error_text: str
     regex_is_found: bool
     regex_result: str
+    queue_time: float | None = None
+    connection_wait_time: float | None = None
+    dns_time: float | None = None
+    connect_time: float | None = None
+    first_byte_time: float | None = None
+    download_time: float | None = None
+
+
+TASK_RESULT_COLUMNS = [field.name for field in fields(TaskResult)]
+
+
+@observe_statement
+async def create_next_task(connection: Connection, url: str, regex: str | None, check_mode: str = "full") -> None:
+    await connection.execute(CREATE_NEXT_TASK, url, regex, check_mode)
+
+
+@observe_statement
+async def get_next_task(connection: Connection, lease_time: int) -> Record:
+    return await connection.fetchrow(GET_NEXT_TASK, lease_time)
 
 
-async def create_next_task(connection: Connection, url: str, regex: str | None) -> None:
-    await connection.execute(CREATE_NEXT_TASK, url, regex)
+@observe_statement
+async def get_next_tasks(connection: Connection, limit: int, lease_time: int) -> list[Record]:
+    return await connection.fetch(GET_NEXT_TASKS, limit, lease_time)
 
 
-async def get_next_task(connection: Connection) -> Record:
-    return await connection.fetchrow(GET_NEXT_TASK)
+@observe_statement
+async def reap_expired_tasks(connection: Connection, limit: int, max_attempts: int, error_text: str) -> list[Record]:
+    return await connection.fetch(REAP_EXPIRED_TASKS, limit, max_attempts, error_text)
 
 
+@observe_statement
 async def finish_task(connection: Connection, task_id: int) -> None:
     await connection.execute(FINISH_TASK, task_id)
 
 
+@observe_statement
+async def finish_tasks(connection: Connection, task_ids: list[int], claimed_ats: list[datetime]) -> list[int]:
+    """Returns ids of finished tasks."""
+    return [row["id"] for row in await connection.fetch(FINISH_TASKS, task_ids, claimed_ats)]
+
+
+@observe_statement
 async def set_result(connection: Connection, task_result: TaskResult) -> None:
     await connection.execute(SET_RESULT, *astuple(task_result))
 
 
-async def create_new_url(connection: Connection, url: str, period: int, regex: str | None = None) -> None:
-    await connection.execute(CREATE_NEW_URL, url, period, regex)
+@observe_statement
+async def set_results(connection: Connection, task_results: list[TaskResult]) -> None:
+    await connection.copy_records_to_table(
+        "task_result",
+        records=[astuple(task_result) for task_result in task_results],
+        columns=TASK_RESULT_COLUMNS,
+    )
+
+
+@observe_statement
+async def create_new_url(
+    connection: Connection,
+    url: str,
+    period: int,
+    regex: str | None = None,
+    check_mode: str = "full",
+) -> None:
+    await connection.execute(CREATE_NEW_URL, url, period, regex, check_mode)
 
 
+@observe_statement
 async def get_next_url(connection: Connection) -> Record:
     return await connection.fetchrow(GET_NEXT_URL)
 
 
+@observe_statement
+async def enqueue_url_group(connection: Connection, url: str, check_mode: str) -> int:
+    return await connection.fetchval(ENQUEUE_URL_GROUP, url, check_mode)
+
+
+@observe_statement
+async def enqueue_due_urls(connection: Connection, limit: int) -> int:
+    return await connection.fetchval(ENQUEUE_DUE_URLS, limit)
+
+
+@observe_statement
+async def get_urls_schedule(connection: Connection, url_ids: list[int] | None = None) -> list[Record]:
+    if url_ids is None:
+        return await connection.fetch(GET_URLS_SCHEDULE)
+
+    return await connection.fetch(GET_URLS_SCHEDULE_BY_IDS, url_ids)
+
+
+@observe_statement
+async def enqueue_urls(connection: Connection, url_ids: list[int]) -> tuple[int, list[Record]]:
+    """Returns amount of created tasks and schedule of urls."""
+    rows = await connection.fetch(ENQUEUE_URLS, url_ids)
+    return rows[0]["amount_of_tasks"] if rows else 0, rows
+
+
+@observe_statement
 async def update_last_run_at(connection: Connection, url_id: int) -> None:
-    dt = datetime.now(timezone.utc)
-    await connection.execute(UPDATE_LAST_RUN_AT, url_id, dt)
+    await connection.execute(UPDATE_LAST_RUN_AT, url_id)
 
 
+@observe_statement
 async def remove_url_by_url(connection: Connection, url: str) -> None:
     await connection.execute(REMOVE_URL_BY_URL, url)
 
 
+@observe_statement
 async def remove_url_by_url_and_regex(connection: Connection, url: str, regex: str) -> None:
     await connection.execute(REMOVE_URL_BY_URL_AND_REGEX, url, regex)
@@ -11,7 +11,11 @@ from conf.config import settings
 async def get_db_pool() -> Generator[Pool, None, None]:
     pool = await asyncpg.create_pool(
         dsn=settings.DB_DSN,
+        timeout=settings.DB_TIMEOUT,
         command_timeout=settings.DB_TIMEOUT,
+        min_size=settings.DB_POOL_MIN_SIZE,
+        max_size=settings.DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME,
     )
 
     yield pool
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import re
+from asyncio import Event, sleep, wait_for
+from contextlib import suppress
+from datetime import date, datetime, time, timedelta, timezone
+
+from asyncpg import Connection, InterfaceError, Pool, PostgresError
+
+from aiven.db.db import get_db_connection
+from conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+GET_TODAY = """
+SELECT (NOW() AT TIME ZONE 'UTC')::date;
+"""
+
+IS_REGULAR_TABLE = """
+SELECT EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass($1) AND relkind = 'r');
+"""
+
+GET_PARTITIONS = """
+SELECT child.relname FROM pg_inherits
+JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+WHERE parent.relname = $1
+ORDER BY child.relname;
+"""
+
+LOCK_PARTITIONS = """
+SELECT pg_try_advisory_xact_lock(hashtext('partition_maintenance'));
+"""
+
+CREATE_PARTITION = """
+CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table}
+    FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00');
+"""
+
+PARTITION_KEYS = {"task": "created_at", "task_result": "timestamp"}
+
+HAS_DEFAULT_ROWS = """
+SELECT EXISTS (SELECT 1 FROM {table}_default WHERE {key} >= $1 AND {key} < $2);
+"""
+
+# partition can't be created while default partition has its rows, they are moved into detached partition first
+CREATE_DETACHED_PARTITION = """
+CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);
+"""
+
+MOVE_DEFAULT_ROWS = """
+WITH moved_rows AS (
+    DELETE FROM {table}_default WHERE {key} >= $1 AND {key} < $2
+    RETURNING *
+), inserted_rows AS (
+    INSERT INTO {partition} SELECT * FROM moved_rows
+    RETURNING 1
+)
+SELECT count(*) FROM inserted_rows;
+"""
+
+ATTACH_PARTITION = """
+ALTER TABLE {table} ATTACH PARTITION {partition}
+    FOR VALUES FROM ('{start} 00:00:00+00') TO ('{end} 00:00:00+00');
+"""
+
+HAS_UNFINISHED_TASKS = """
+SELECT EXISTS (SELECT 1 FROM {partition} WHERE status IN (0, 1));
+"""
+
+DROP_PARTITION = """
+DROP TABLE IF EXISTS {partition};
+"""
+
+
+class NotPartitionedTableError(Exception):
+    """Existing regular table isn't converted into partitioned one."""
+
+    def __init__(self, table: str) -> None:
+        super().__init__(
+            f"table {table} exists and isn't partitioned, partitioning can be enabled only for a new table",
+        )
+
+
+async def check_partitioned(connection: Connection, table: str) -> None:
+    """Raises NotPartitionedTableError if table exists and isn't partitioned. Missing table is created later."""
+    if await connection.fetchval(IS_REGULAR_TABLE, table):
+        raise NotPartitionedTableError(table)
+
+
+def get_partition_name(table: str, day: date) -> str:
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def get_partition_day(table: str, partition: str) -> date | None:
+    if match := re.fullmatch(rf"{table}_p(\d{{4}})(\d{{2}})(\d{{2}})", partition):
+        return date(*map(int, match.groups()))
+
+    return None
+
+
+async def create_partition(connection: Connection, table: str, day: date) -> str:
+    partition = get_partition_name(table, day)
+    end = day + timedelta(days=1)
+    query_params = {"partition": partition, "table": table, "key": PARTITION_KEYS[table], "start": day, "end": end}
+    bounds = [datetime.combine(bound, time(), timezone.utc) for bound in (day, end)]
+    if not await connection.fetchval(HAS_DEFAULT_ROWS.format(**query_params), *bounds):
+        await connection.execute(CREATE_PARTITION.format(**query_params))
+        return partition
+
+    await connection.execute(CREATE_DETACHED_PARTITION.format(**query_params))
+    amount_of_rows = await connection.fetchval(MOVE_DEFAULT_ROWS.format(**query_params), *bounds)
+    await connection.execute(ATTACH_PARTITION.format(**query_params))
+    logger.info("Move %s rows from default partition into %s", amount_of_rows, partition)
+    return partition
+
+
+async def create_partitions(connection: Connection, table: str, days_ahead: int) -> list[str]:
+    """Creates daily partitions (UTC) from today up to `days_ahead` days."""
+    today = await connection.fetchval(GET_TODAY)
+    return [await create_partition(connection, table, today + timedelta(days=days)) for days in range(days_ahead + 1)]
+
+
+async def drop_partitions(connection: Connection, table: str, retention_days: int) -> list[str]:
+    """Drops daily partitions older than `retention_days` days.
+
+    Partitions of table `task` are dropped only when all their tasks are finished.
+    """
+    today = await connection.fetchval(GET_TODAY)
+    partitions = []
+    for partition in await connection.fetch(GET_PARTITIONS, table):
+        day = get_partition_day(table, partition["relname"])
+        if day is None or day >= today - timedelta(days=retention_days):
+            continue
+
+        if table == "task" and await connection.fetchval(HAS_UNFINISHED_TASKS.format(partition=partition["relname"])):
+            logger.info("Partition %s has unfinished tasks", partition["relname"])
+            continue
+
+        await connection.execute(DROP_PARTITION.format(partition=partition["relname"]))
+        partitions.append(partition["relname"])
+
+    return partitions
+
+
+async def maintain_partitions(connection: Connection) -> None:
+    async with connection.transaction():
+        if not await connection.fetchval(LOCK_PARTITIONS):
+            logger.info("Partitions are maintained by another process")
+            return
+
+        if settings.TASK_PARTITIONING:
+            await maintain_table_partitions(connection, "task", settings.TASK_RETENTION_DAYS)
+
+        if settings.RESULT_PARTITIONING:
+            await maintain_table_partitions(connection, "task_result", settings.RESULT_RETENTION_DAYS)
+
+
+async def maintain_table_partitions(connection: Connection, table: str, retention_days: int) -> None:
+    try:
+        await check_partitioned(connection, table)
+    except NotPartitionedTableError:
+        # the other table is still maintained
+        logger.exception("Partitions of %s aren't maintained", table)
+        return
+
+    await create_partitions(connection, table, settings.PARTITIONS_AHEAD)
+    if partitions := await drop_partitions(connection, table, retention_days):
+        logger.info("Drop partitions: %s", partitions)
+
+
+async def start_partition_maintenance(stop_event: Event, pool: Pool) -> None:
+    while not stop_event.is_set():
+        try:
+            async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
+                await maintain_partitions(connection)
+        except (PostgresError, InterfaceError, asyncio.TimeoutError):
+            logger.exception("Exception in partition maintenance")
+            await sleep(settings.SLEEP_AFTER_EXCEPTION)
+
+        with suppress(asyncio.TimeoutError):
+            await wait_for(stop_event.wait(), timeout=settings.PARTITION_MAINTENANCE_INTERVAL)
+
+
+async def main() -> None:
+    async with get_db_connection() as connection:
+        await maintain_partitions(connection)
+
+
+if __name__ == "__main__":
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(main())
+    loop.close()
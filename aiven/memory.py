@@ -0,0 +1,95 @@
+import logging
+import os
+import signal
+import time
+import tracemalloc
+from asyncio import AbstractEventLoop
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MEMORY_SIGNAL = signal.SIGUSR2
+
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class MemoryTracker:
+    """Takes `tracemalloc` snapshots and keeps top allocation sites by growth since start and since previous snapshot.
+
+    Tracing of allocations slows down the process, so it's started only in diagnostics mode.
+    """
+
+    def __init__(self, name: str, top_size: int, traceback_depth: int, directory: str) -> None:
+        self.__name = name
+        self.__top_size = top_size
+        self.__traceback_depth = traceback_depth
+        self.__directory = Path(directory)
+        self.__key_type = "traceback" if traceback_depth > 1 else "lineno"
+        self.__first_snapshot: tracemalloc.Snapshot | None = None
+        self.__previous_snapshot: tracemalloc.Snapshot | None = None
+        self.since_start: list[tracemalloc.StatisticDiff] = []
+        self.since_previous: list[tracemalloc.StatisticDiff] = []
+
+    def start(self) -> None:
+        tracemalloc.start(self.__traceback_depth)
+        self.__first_snapshot = self.__previous_snapshot = self.__take_snapshot()
+
+    def stop(self) -> None:
+        tracemalloc.stop()
+        self.__first_snapshot = self.__previous_snapshot = None
+
+    def take_snapshot(self) -> None:
+        snapshot = self.__take_snapshot()
+        self.since_start = snapshot.compare_to(self.__first_snapshot, self.__key_type)[: self.__top_size]
+        self.since_previous = snapshot.compare_to(self.__previous_snapshot, self.__key_type)[: self.__top_size]
+        self.__previous_snapshot = snapshot
+        current_size, peak_size = tracemalloc.get_traced_memory()
+        logger.info("Traced memory: %s KiB, peak: %s KiB", current_size // 1024, peak_size // 1024)
+
+    def report(self) -> str:
+        lines = [f"Growth since start, top {self.__top_size}:"]
+        lines += self.__format(self.since_start)
+        lines += ["", f"Growth since previous snapshot, top {self.__top_size}:"]
+        lines += self.__format(self.since_previous)
+        return "\n".join(lines) + "\n"
+
+    def dump(self) -> Path:
+        """Takes a fresh snapshot and writes top allocation sites to file."""
+        self.take_snapshot()
+        path = self.__directory / f"{self.__name}-{os.getpid()}-{int(time.time())}.memory"
+        path.write_text(self.report())
+        logger.info("Write memory report into %s", path)
+        return path
+
+    def __take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    @staticmethod
+    def __format(statistics: list[tracemalloc.StatisticDiff]) -> list[str]:
+        lines = []
+        for statistic in statistics:
+            lines.append(str(statistic))
+            # the first frame is a part of str(statistic)
+            lines += [f"    {frame}" for frame in statistic.traceback[1:]]
+
+        return lines
+
+
+def add_memory_diagnostics(loop: AbstractEventLoop, tracker: MemoryTracker, interval: float) -> None:
+    """Starts tracing, takes snapshot every `interval` seconds, `kill -USR2 <pid>` dumps report."""
+    tracker.start()
+
+    def take_snapshot() -> None:
+        if not tracemalloc.is_tracing():
+            return
+
+        tracker.take_snapshot()
+        loop.call_later(interval, take_snapshot)
+
+    loop.call_later(interval, take_snapshot)
+    loop.add_signal_handler(MEMORY_SIGNAL, tracker.dump)
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from asyncio import Event
+from bisect import bisect_left
+from collections.abc import Awaitable, Callable, Iterator
+from functools import wraps
+from typing import ParamSpec, TypeVar
+
+from aiohttp import web
+from asyncpg import InterfaceError, Pool, PostgresError
+
+logger = logging.getLogger(__name__)
+
+P = ParamSpec("P")
+T = TypeVar("T")
+M = TypeVar("M", bound="Metric")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# pending and started tasks are counted by partial indexes, which contain only such tasks
+GET_ROWS_ESTIMATES = """
+SELECT parent.relname AS relation, sum(greatest(child.reltuples, 0))::bigint AS amount
+FROM pg_class parent
+LEFT JOIN pg_inherits ON pg_inherits.inhparent = parent.oid
+JOIN pg_class child ON child.oid = coalesce(pg_inherits.inhrelid, parent.oid)
+WHERE parent.relname = ANY($1::text[])
+GROUP BY parent.relname;
+"""
+
+ESTIMATED_RELATIONS = {
+    "url": "url",
+    "task__pending__idx": "pending_task",
+    "task__lease_until__idx": "started_task",
+    "task_result": "task_result",
+}
+
+
+class Metric(ABC):
+    """Metric in Prometheus text format. Values of labels are passed positionally, in order of `labels`."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+
+    @abstractmethod
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        """Yields name, labels and value of every sample."""
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples():
+            if labels:
+                formatted_labels = ",".join(f'{label}="{label_value}"' for label, label_value in labels.items())
+                lines.append(f"{name}{{{formatted_labels}}} {value}")
+            else:
+                lines.append(f"{name} {value}")
+
+        return lines
+
+
+class Value(Metric):
+    """Metric with one value by labels, value can be taken from function when metric is rendered."""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, description, labels)
+        self.__values: dict[tuple[str, ...], float] = {}
+        self.__function: Callable[[], float] | None = None
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """For values which are kept by another object, like size of queue."""
+        self.__function = function
+
+    def _add(self, labels: tuple[str, ...], amount: float) -> None:
+        self.__values[labels] = self.__values.get(labels, 0) + amount
+
+    def _set(self, labels: tuple[str, ...], value: float) -> None:
+        self.__values[labels] = value
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        if self.__function is not None:
+            yield self.name, {}, self.__function()
+
+        for labels, value in self.__values.items():
+            yield self.name, dict(zip(self.labels, labels)), value
+
+
+class Counter(Value):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._add(labels, amount)
+
+
+class Gauge(Value):
+    type = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._add(labels, amount)
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self._add(labels, -amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        self._set(labels, value)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, description, labels)
+        self.__buckets = buckets
+        # amounts of observations by buckets (not cumulative, the last one is +Inf) and their sum
+        self.__values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        if (values := self.__values.get(labels)) is None:
+            values = self.__values[labels] = ([0] * (len(self.__buckets) + 1), [0.0])
+
+        values[0][bisect_left(self.__buckets, value)] += 1
+        values[1][0] += value
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        for labels, (amounts, total) in self.__values.items():
+            named_labels = dict(zip(self.labels, labels))
+            cumulative_amount = 0
+            for bucket, amount in zip((*self.__buckets, "+Inf"), amounts):
+                cumulative_amount += amount
+                yield f"{self.name}_bucket", {**named_labels, "le": str(bucket)}, cumulative_amount
+
+            yield f"{self.name}_sum", named_labels, total[0]
+            yield f"{self.name}_count", named_labels, cumulative_amount
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.__metrics: dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        self.__metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.__metrics.values() for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+tasks_created = registry.register(Counter("aiven_tasks_created_total", "Tasks created by producer"))
+tasks_claimed = registry.register(Counter("aiven_tasks_claimed_total", "Tasks claimed by consumer"))
+tasks_fetched = registry.register(
+    Counter("aiven_tasks_fetched_total", "Checked tasks by class of status", ("status_class",)),
+)
+tasks_written = registry.register(Counter("aiven_tasks_written_total", "Results of tasks written to db"))
+tasks_dropped = registry.register(Counter("aiven_tasks_dropped_total", "Results of tasks dropped after db errors"))
+fetch_duration = registry.register(
+    Histogram("aiven_fetch_duration_seconds", "Duration of fetching of url by class of status", ("status_class",)),
+)
+fetches_in_flight = registry.register(Gauge("aiven_fetches_in_flight", "Urls which are fetched right now"))
+queue_size = registry.register(Gauge("aiven_queue_size", "Claimed tasks waiting for consumer's workers"))
+regex_cache_hits = registry.register(Counter("aiven_regex_cache_hits_total", "Regexes found in cache"))
+regex_cache_misses = registry.register(Counter("aiven_regex_cache_misses_total", "Regexes compiled"))
+db_statement_duration = registry.register(
+    Histogram("aiven_db_statement_duration_seconds", "Duration of db statements", ("statement",)),
+)
+rows_estimate = registry.register(
+    Gauge("aiven_rows_estimate", "Amount of rows estimated by postgres statistics", ("relation",)),
+)
+
+
+def get_status_class(status_code: int) -> str:
+    return f"{status_code // 100}xx" if status_code else "error"
+
+
+def observe_statement(func: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
+    """Observes duration of db statement, name of function is a label."""
+
+    @wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+        start_time = time.monotonic()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            db_statement_duration.observe(time.monotonic() - start_time, func.__name__)
+
+    return wrapper
+
+
+async def update_rows_estimates(pool: Pool, acquire_timeout: float) -> None:
+    """Takes amounts of rows from `pg_class`, it doesn't scan tables. Statistics is updated by (auto)vacuum."""
+    try:
+        async with pool.acquire(timeout=acquire_timeout) as connection:
+            rows = await connection.fetch(GET_ROWS_ESTIMATES, list(ESTIMATED_RELATIONS))
+    except (PostgresError, InterfaceError, asyncio.TimeoutError):
+        logger.exception("Can't get estimates of rows")
+        return
+
+    for row in rows:
+        rows_estimate.set(row["amount"], ESTIMATED_RELATIONS[row["relation"]])
+
+
+async def start_metrics_server(stop_event: Event, pool: Pool, host: str, port: int, acquire_timeout: float) -> None:
+    """Serves metrics on `/metrics` until `stop_event` is set. Estimates of rows are updated on every request."""
+
+    async def get_metrics(request: web.Request) -> web.Response:
+        await update_rows_estimates(pool, acquire_timeout)
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", get_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        logger.info("Serve metrics on %s:%s", host, port)
+        await stop_event.wait()
+    finally:
+        await runner.cleanup()
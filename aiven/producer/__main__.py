@@ -1,10 +1,23 @@
 import asyncio
 
+from aiven.memory import MemoryTracker, add_memory_diagnostics
 from aiven.producer.worker import start_workers
+from aiven.profiler import StackSampler, add_profile_signal_handler
 from conf.config_producer import settings
 
 if __name__ == "__main__":
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
+    sampler = StackSampler("producer", settings.PROFILE_INTERVAL, settings.PROFILE_DURATION, settings.PROFILE_DIR)
+    add_profile_signal_handler(loop, sampler)
+    if settings.MEMORY_DIAGNOSTICS:
+        tracker = MemoryTracker(
+            "producer",
+            settings.MEMORY_TOP_SIZE,
+            settings.MEMORY_TRACEBACK_DEPTH,
+            settings.PROFILE_DIR,
+        )
+        add_memory_diagnostics(loop, tracker, settings.MEMORY_SNAPSHOT_INTERVAL)
+
     loop.run_until_complete(start_workers(settings.CONCURRENCY))
     loop.close()
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+from asyncio import Event, get_running_loop, sleep, wait_for
+from contextlib import suppress
+from heapq import heappop, heappush
+
+from asyncpg import Connection, InterfaceError, Pool, PostgresError, Record
+
+from aiven.db.crud import URL_CHANGED_CHANNEL, enqueue_urls, get_urls_schedule
+from aiven.metrics import tasks_created
+from conf.config_producer import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UrlSchedule:
+    """Heap of url ids ordered by time of their next run (event loop clock).
+
+    Removed and rescheduled urls leave stale entries in the heap, they are skipped lazily.
+    """
+
+    def __init__(self) -> None:
+        self.__heap: list[tuple[float, int]] = []
+        self.__due_at: dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self.__due_at)
+
+    def schedule(self, url_id: int, due_at: float) -> None:
+        self.__due_at[url_id] = due_at
+        heappush(self.__heap, (due_at, url_id))
+
+    def remove(self, url_id: int) -> None:
+        self.__due_at.pop(url_id, None)
+
+    def next_due_at(self) -> float | None:
+        while self.__heap:
+            due_at, url_id = self.__heap[0]
+            if self.__due_at.get(url_id) == due_at:
+                return due_at
+
+            heappop(self.__heap)
+
+        return None
+
+    def pop_due(self, now: float, limit: int) -> list[int]:
+        url_ids = []
+        while len(url_ids) < limit and (due_at := self.next_due_at()) is not None and due_at <= now:
+            _, url_id = heappop(self.__heap)
+            del self.__due_at[url_id]
+            url_ids.append(url_id)
+
+        return url_ids
+
+
+def update_schedule(
+    schedule: UrlSchedule,
+    url_ids: list[int],
+    rows: list[Record],
+    now: float,
+    min_delay: float = 0,
+) -> None:
+    """Puts urls back to schedule. Urls without rows were removed from table `url`."""
+    for url_id in url_ids:
+        schedule.remove(url_id)
+
+    for row in rows:
+        schedule.schedule(row["id"], now + max(row["delay"], min_delay))
+
+
+async def run_scheduler(stop_event: Event, pool: Pool) -> None:
+    loop = get_running_loop()
+    schedule = UrlSchedule()
+    changed_url_ids: set[int] = set()
+    wake_up = Event()
+
+    def on_url_changed(connection: Connection, pid: int, channel: str, payload: str) -> None:
+        changed_url_ids.add(json.loads(payload)["id"])
+        wake_up.set()
+
+    async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as listen_connection:
+        # listen before loading, so changes made during loading are not lost
+        await listen_connection.add_listener(URL_CHANGED_CHANNEL, on_url_changed)
+        try:
+            async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
+                rows = await get_urls_schedule(connection)
+
+            now = loop.time()
+            for url_id, delay in rows:
+                schedule.schedule(url_id, now + delay)
+
+            logger.info("Load schedule of %s urls", len(schedule))
+            reload_at = now + settings.SCHEDULE_RELOAD_INTERVAL
+            while not stop_event.is_set() and loop.time() < reload_at:
+                wake_up.clear()
+                if changed_url_ids:
+                    url_ids = list(changed_url_ids)
+                    changed_url_ids.clear()
+                    async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
+                        rows = await get_urls_schedule(connection, url_ids)
+
+                    update_schedule(schedule, url_ids, rows, loop.time())
+                    logger.info("Reschedule %s changed urls", len(url_ids))
+
+                if url_ids := schedule.pop_due(loop.time(), settings.ENQUEUE_BATCH_SIZE):
+                    async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
+                        amount_of_tasks, rows = await enqueue_urls(connection, url_ids)
+
+                    # url which is still due is locked by another producer or db clock is behind ours
+                    update_schedule(schedule, url_ids, rows, loop.time(), min_delay=settings.SLEEP_WITHOUT_TASK)
+                    logger.info("Create %s tasks for %s due urls", amount_of_tasks, len(url_ids))
+                    tasks_created.inc(amount=amount_of_tasks)
+                    continue
+
+                # stop_event is checked at least every SLEEP_WITHOUT_TASK, it doesn't touch db
+                wake_up_at = min(reload_at, loop.time() + settings.SLEEP_WITHOUT_TASK)
+                if (next_due_at := schedule.next_due_at()) is not None:
+                    wake_up_at = min(wake_up_at, next_due_at)
+
+                with suppress(asyncio.TimeoutError):
+                    await wait_for(wake_up.wait(), timeout=max(wake_up_at - loop.time(), 0))
+        finally:
+            await listen_connection.remove_listener(URL_CHANGED_CHANNEL, on_url_changed)
+
+
+async def start_scheduler(stop_event: Event, pool: Pool) -> None:
+    # whole schedule is reloaded periodically and after exceptions, in case some notifications were lost
+    while not stop_event.is_set():
+        try:
+            await run_scheduler(stop_event, pool)
+        except (PostgresError, InterfaceError, asyncio.TimeoutError):
+            logger.exception("Exception in producer's scheduler")
+            await sleep(settings.SLEEP_AFTER_EXCEPTION)
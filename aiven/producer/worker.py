@@ -4,34 +4,55 @@ from asyncio import Event, ensure_future, gather, sleep
 
 from asyncpg import InterfaceError, Pool, PostgresError
 
-from aiven.db.crud import create_next_task, get_next_url, update_last_run_at
+from aiven.db.crud import enqueue_due_urls, enqueue_url_group, get_next_url
 from aiven.db.db import get_db_pool
+from aiven.db.partitions import start_partition_maintenance
+from aiven.metrics import start_metrics_server, tasks_created
+from aiven.producer.scheduler import start_scheduler
 from conf.config_producer import settings
 
 logger = logging.getLogger(__name__)
 
 
 async def start_worker(stop_event: Event, pool: Pool) -> None:
-    async with pool.acquire() as connection:
-        while not stop_event.is_set():
-            try:
+    while not stop_event.is_set():
+        try:
+            async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
                 async with connection.transaction():
                     next_url = await get_next_url(connection)
                     if next_url:
-                        url_id, url, regex = next_url
-                        logger.info("Create task. url: %s, regex: %s", (url, regex))
-                        await create_next_task(connection, url, regex)
-                        await update_last_run_at(connection, url_id)
+                        # tasks of all regexes of url are created together, so consumer fetches url once
+                        amount_of_tasks = await enqueue_url_group(connection, next_url["url"], next_url["check_mode"])
+                        logger.info("Create %s tasks. url: %s", amount_of_tasks, next_url["url"])
+                        tasks_created.inc(amount=amount_of_tasks)
 
-                if not next_url:
-                    await sleep(settings.SLEEP_WITHOUT_TASK)
+            if not next_url:
+                await sleep(settings.SLEEP_WITHOUT_TASK)
 
-            except (PostgresError, InterfaceError, asyncio.TimeoutError):
-                logger.exception("Exception in producer")
-                # TODO: Circuit breaker design pattern
-                # (https://en.wikipedia.org/wiki/Circuit_breaker_design_pattern#:~:text=Circuit%20breaker%20is%20a%20design,failure%20or%20unexpected%20system%20difficulties.)
-                await sleep(settings.SLEEP_AFTER_EXCEPTION)
-                # TODO: add slack/email notification
+        except (PostgresError, InterfaceError, asyncio.TimeoutError):
+            logger.exception("Exception in producer")
+            # TODO: Circuit breaker design pattern
+            # (https://en.wikipedia.org/wiki/Circuit_breaker_design_pattern#:~:text=Circuit%20breaker%20is%20a%20design,failure%20or%20unexpected%20system%20difficulties.)
+            await sleep(settings.SLEEP_AFTER_EXCEPTION)
+            # TODO: add slack/email notification
+
+
+async def start_bulk_worker(stop_event: Event, pool: Pool) -> None:
+    while not stop_event.is_set():
+        try:
+            async with pool.acquire(timeout=settings.DB_POOL_ACQUIRE_TIMEOUT) as connection:
+                amount_of_tasks = await enqueue_due_urls(connection, settings.ENQUEUE_BATCH_SIZE)
+
+            if amount_of_tasks:
+                logger.info("Create %s tasks", amount_of_tasks)
+                tasks_created.inc(amount=amount_of_tasks)
+
+            if amount_of_tasks < settings.ENQUEUE_BATCH_SIZE:
+                await sleep(settings.SLEEP_WITHOUT_TASK)
+
+        except (PostgresError, InterfaceError, asyncio.TimeoutError):
+            logger.exception("Exception in producer")
+            await sleep(settings.SLEEP_AFTER_EXCEPTION)
 
 
 async def start_workers(max_workers: int, stop_event: Event | None = None) -> None:
@@ -41,7 +62,26 @@ async def start_workers(max_workers: int, stop_event: Event | None = None) -> No
 
     try:
         async with get_db_pool() as pool:
-            tasks = [ensure_future(start_worker(stop_event, pool)) for _ in range(max_workers)]
+            if settings.MODE == "schedule":
+                # one in-memory schedule per process, it doesn't need concurrent workers
+                tasks = [ensure_future(start_scheduler(stop_event, pool))]
+            else:
+                worker = start_bulk_worker if settings.MODE == "bulk" else start_worker
+                tasks = [ensure_future(worker(stop_event, pool)) for _ in range(max_workers)]
+            if settings.TASK_PARTITIONING or settings.RESULT_PARTITIONING:
+                tasks.append(ensure_future(start_partition_maintenance(stop_event, pool)))
+            if settings.METRICS_ENABLED:
+                tasks.append(
+                    ensure_future(
+                        start_metrics_server(
+                            stop_event,
+                            pool,
+                            settings.METRICS_HOST,
+                            settings.METRICS_PORT,
+                            settings.DB_POOL_ACQUIRE_TIMEOUT,
+                        ),
+                    ),
+                )
             await gather(*tasks)
     except (PostgresError, InterfaceError, asyncio.TimeoutError):
         logger.exception("Can't start producer's workers")
@@ -0,0 +1,84 @@
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from asyncio import AbstractEventLoop
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SIGNAL = signal.SIGUSR1
+
+
+def collapse_stack(frame: FrameType | None) -> str:
+    """Returns stack in collapsed format of flamegraph.pl and speedscope: from the outermost call, split by `;`."""
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+
+    return ";".join(reversed(calls))
+
+
+class StackSampler:
+    """Samples stack of thread from another thread for `duration` seconds and writes collapsed stacks to file.
+
+    Nothing runs between profilings, every sample holds GIL only to walk the stack.
+    """
+
+    def __init__(self, name: str, interval: float, duration: float, directory: str) -> None:
+        self.__name = name
+        self.__interval = interval
+        self.__duration = duration
+        self.__directory = Path(directory)
+        self.__thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self, thread_id: int | None = None) -> bool:
+        """Starts profiling of thread (current one by default). Returns False if profiling is already running."""
+        if self.running:
+            logger.warning("Profiling is already running")
+            return False
+
+        self.__thread = threading.Thread(
+            target=self.__run,
+            args=(thread_id or threading.get_ident(),),
+            name="stack-sampler",
+            daemon=True,
+        )
+        self.__thread.start()
+        return True
+
+    def join(self) -> None:
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def __run(self, thread_id: int) -> None:
+        logger.info("Start profiling for %s seconds", self.__duration)
+        stacks: Counter[str] = Counter()
+        deadline = time.monotonic() + self.__duration
+        while time.monotonic() < deadline:
+            if frame := sys._current_frames().get(thread_id):
+                stacks[collapse_stack(frame)] += 1
+                # frame keeps locals of profiled code alive
+                del frame
+
+            time.sleep(self.__interval)
+
+        path = self.__directory / f"{self.__name}-{os.getpid()}-{int(time.time())}.collapsed"
+        path.write_text("".join(f"{stack} {amount}\n" for stack, amount in stacks.most_common()))
+        logger.info("Write %s samples of profiling into %s", stacks.total(), path)
+
+
+def add_profile_signal_handler(loop: AbstractEventLoop, sampler: StackSampler) -> None:
+    """`kill -USR1 <pid>` profiles thread of event loop."""
+    thread_id = threading.get_ident()
+    loop.add_signal_handler(PROFILE_SIGNAL, sampler.start, thread_id)
@@ -4,8 +4,28 @@ from pydantic_settings import BaseSettings
 class CommonSettings(BaseSettings):
     DB_DSN: str
     DB_TIMEOUT: int = 5
+    DB_POOL_MIN_SIZE: int = 1
+    DB_POOL_MAX_SIZE: int = 10
+    DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME: float = 300
+    DB_POOL_ACQUIRE_TIMEOUT: int = 5
     MIN_PERIOD: int = 5
     MAX_PERIOD: int = 300
+    TASK_PARTITIONING: bool = False
+    PARTITIONS_AHEAD: int = 3
+    TASK_RETENTION_DAYS: int = 7
+    RESULT_PARTITIONING: bool = False
+    RESULT_RETENTION_DAYS: int = 30
+    PARTITION_MAINTENANCE_INTERVAL: int = 3600
+    METRICS_ENABLED: bool = False
+    METRICS_HOST: str = "0.0.0.0"
+    METRICS_PORT: int = 8000
+    PROFILE_INTERVAL: float = 0.005
+    PROFILE_DURATION: float = 30
+    PROFILE_DIR: str = "/tmp"
+    MEMORY_DIAGNOSTICS: bool = False
+    MEMORY_SNAPSHOT_INTERVAL: float = 300
+    MEMORY_TOP_SIZE: int = 20
+    MEMORY_TRACEBACK_DEPTH: int = 1
 
 
 settings = CommonSettings()
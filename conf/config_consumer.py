@@ -1,11 +1,47 @@
+from typing import Literal
+
 from conf.config import CommonSettings
 
 
 class Settings(CommonSettings):
     CONCURRENCY: int = 100
     HTTP_REQUEST_TIMEOUT: int = 1
+    HTTP_LIMIT: int = 100
+    HTTP_LIMIT_PER_HOST: int = 0
+    HTTP_DNS_CACHE_TTL: int = 300
+    # longer than MAX_PERIOD, so next check of the same url reuses connection
+    HTTP_KEEPALIVE_TIMEOUT: float = 330
+    STREAM_BODY: bool = False
+    STREAM_CHUNK_SIZE: int = 64 * 1024
+    STREAM_OVERLAP_SIZE: int = 4 * 1024
+    MAX_BODY_SIZE: int = 10 * 1024 * 1024
+    FIND_ALL_MATCHES: bool = True
+    BYTES_REGEX: bool = False
+    REGEX_CACHE_SIZE: int = 10000
+    REGEX_ENGINE: Literal["re", "hyperscan"] = "re"
+    STATUS_ONLY_MAX_READ_SIZE: int = 64 * 1024
+    REGEX_PROCESSES: int = 0
+    REGEX_TIMEOUT: float = 1
+    REGEX_SHARED_MEMORY_SIZE: int = 1024 * 1024
+    PROCESSES: int = 1
+    EVENT_LOOP: Literal["asyncio", "uvloop"] = "asyncio"
+    RESTART_DELAY: float = 1
+    SHUTDOWN_TIMEOUT: float = 30
     SLEEP_WITHOUT_TASK: int = 1
     SLEEP_AFTER_EXCEPTION: int = 1
+    LISTEN_FOR_TASKS: bool = True
+    BATCH_SIZE: int = 100
+    LEASE_TIME: int = 60
+    MAX_TASK_ATTEMPTS: int = 3
+    REAPER_ENABLED: bool = True
+    REAPER_INTERVAL: int = 30
+    REAPER_BATCH_SIZE: int = 1000
+    QUEUE_SIZE: int = 200
+    QUEUE_REFILL_THRESHOLD: int = 50
+    RESULT_BATCH_SIZE: int = 500
+    RESULT_BUFFER_SIZE: int = 1000
+    RESULT_FLUSH_INTERVAL: float = 1
+    RESULT_FLUSH_ATTEMPTS: int = 3
 
 
 settings = Settings()
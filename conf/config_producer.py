@@ -1,3 +1,5 @@
+from typing import Literal
+
 from conf.config import CommonSettings
 
 
@@ -5,6 +7,9 @@ class Settings(CommonSettings):
     CONCURRENCY: int = 3
     SLEEP_WITHOUT_TASK: int = 1
     SLEEP_AFTER_EXCEPTION: int = 1
+    MODE: Literal["single", "bulk", "schedule"] = "single"
+    ENQUEUE_BATCH_SIZE: int = 1000
+    SCHEDULE_RELOAD_INTERVAL: int = 300
 
 
 settings = Settings()
@@ -0,0 +1,241 @@
+import os
+import time
+from asyncio import Event, ensure_future, gather, sleep
+from collections.abc import Generator
+from dataclasses import dataclass
+from random import Random
+
+import pytest
+from _pytest.capture import CaptureFixture
+from _pytest.monkeypatch import MonkeyPatch
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from asyncpg import Connection
+
+from aiven.consumer.worker import start_workers as start_consumer
+from aiven.metrics import Metric, db_statement_duration, tasks_written
+from aiven.producer.worker import start_workers as start_producer
+from conf.config_consumer import settings as consumer_settings
+from conf.config_producer import settings as producer_settings
+
+GET_AMOUNT_OF_RESULTS = """
+SELECT count(*) FROM task_result;
+"""
+
+# lag is counted from creation of task by producer till writing of its result by consumer
+GET_LAG_PERCENTILES = """
+SELECT
+    percentile_cont(ARRAY[0.5, 0.95, 0.99])
+    WITHIN GROUP (ORDER BY extract(EPOCH FROM task_result.timestamp - task.created_at))
+FROM task_result
+JOIN task ON task.id = task_result.task_id;
+"""
+
+GET_AMOUNT_OF_ERRORS = """
+SELECT count(*) FROM task_result WHERE status_code != 200;
+"""
+
+# pending statistics of current backend are flushed when it becomes idle
+FLUSH_STATS = """
+SELECT pg_stat_force_next_flush();
+"""
+
+GET_AMOUNT_OF_TRANSACTIONS = """
+SELECT xact_commit + xact_rollback FROM pg_stat_database WHERE datname = current_database();
+"""
+
+GET_AMOUNT_OF_BACKENDS = """
+SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() AND backend_type = 'client backend';
+"""
+
+
+@dataclass
+class BenchmarkConfig:
+    urls: int
+    latency: float
+    body_size: int
+    error_rate: float
+    concurrency: int
+    timeout_rate: float = 0
+    reset_rate: float = 0
+    request_timeout: float = 10
+
+    @classmethod
+    def from_env(cls) -> "BenchmarkConfig":
+        """Benchmark is configured by environment, for instance `BENCHMARK_URLS=10000 pytest -m benchmark`."""
+        return cls(
+            urls=int(os.environ.get("BENCHMARK_URLS", 1000)),
+            latency=float(os.environ.get("BENCHMARK_LATENCY", 0.05)),
+            body_size=int(os.environ.get("BENCHMARK_BODY_SIZE", 10 * 1024)),
+            error_rate=float(os.environ.get("BENCHMARK_ERROR_RATE", 0.1)),
+            concurrency=int(os.environ.get("BENCHMARK_CONCURRENCY", 100)),
+            timeout_rate=float(os.environ.get("BENCHMARK_TIMEOUT_RATE", 0)),
+            reset_rate=float(os.environ.get("BENCHMARK_RESET_RATE", 0)),
+            request_timeout=float(os.environ.get("BENCHMARK_REQUEST_TIMEOUT", 10)),
+        )
+
+
+@dataclass
+class BenchmarkResult:
+    checks: int
+    errors: int
+    duration: float
+    lag_percentiles: list[float]
+    db_transactions: int
+    crud_calls: int
+
+    def report(self) -> str:
+        p50, p95, p99 = self.lag_percentiles
+        return (
+            f"checks: {self.checks}, errors: {self.errors}, duration: {self.duration:.2f} s, "
+            f"checks/sec: {self.checks / self.duration:.1f}, lag p50/p95/p99: {p50:.3f}/{p95:.3f}/{p99:.3f} s, "
+            f"db transactions per check: {self.db_transactions / self.checks:.2f}, "
+            f"crud calls per check: {self.crud_calls / self.checks:.2f}"
+        )
+
+
+def get_amount(metric: Metric) -> int:
+    """Sum of counter, or of `_count` samples of histogram."""
+    return sum(value for name, _, value in metric.samples() if name == metric.name or name.endswith("_count"))
+
+
+async def get_amount_of_db_transactions(connection: Connection) -> int:
+    """Transactions of the whole db, counted by server, including 2 transactions of this call."""
+    await connection.execute(FLUSH_STATS)
+    return await connection.fetchval(GET_AMOUNT_OF_TRANSACTIONS)
+
+
+@pytest.fixture()
+async def stub_server(config: BenchmarkConfig) -> Generator[TestServer, None, None]:
+    """Responds with `body_size` bytes after `latency` seconds.
+
+    Shares of urls set by `error_rate`, `timeout_rate` and `reset_rate` respond with 500, respond later than request
+    timeout of consumer or reset connection, failing urls are spread randomly but the same for every run.
+    """
+    body = b"a" * (config.body_size - len("benchmark")) + b"benchmark"
+    responses = (
+        ["reset"] * round(config.urls * config.reset_rate)
+        + ["timeout"] * round(config.urls * config.timeout_rate)
+        + ["error"] * round(config.urls * config.error_rate)
+    )
+    responses += ["ok"] * (config.urls - len(responses))
+    Random(0).shuffle(responses)
+
+    async def respond(request: web.Request) -> web.Response:
+        response = responses[int(request.match_info["path"])]
+        if response == "reset":
+            request.transport.abort()
+            raise ConnectionResetError
+
+        await sleep(config.latency + (config.request_timeout if response == "timeout" else 0))
+        return web.Response(body=body, status=500 if response == "error" else 200, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{path}", respond)
+    server = TestServer(app, host="127.0.0.1", port=8080)
+    await server.start_server()
+    yield server
+    await server.close()
+
+
+async def run_benchmark(
+    db_connection: Connection,
+    monkeypatch: MonkeyPatch,
+    config: BenchmarkConfig,
+    timeout: float,
+) -> BenchmarkResult:
+    """Loads urls, runs producer and consumer until every url is checked once."""
+    monkeypatch.setattr(producer_settings, "MODE", "bulk")
+    monkeypatch.setattr(consumer_settings, "HTTP_REQUEST_TIMEOUT", config.request_timeout)
+    # every url is checked once during benchmark
+    await db_connection.copy_records_to_table(
+        "url",
+        records=[
+            (f"http://127.0.0.1:8080/{number}", producer_settings.MAX_PERIOD, "benchmark")
+            for number in range(config.urls)
+        ],
+        columns=["url", "period", "regex"],
+    )
+
+    backends = await db_connection.fetchval(GET_AMOUNT_OF_BACKENDS)
+    db_transactions = await get_amount_of_db_transactions(db_connection)
+    crud_calls = get_amount(db_statement_duration)
+    results = get_amount(tasks_written)
+    stop_event = Event()
+    start_time = time.monotonic()
+    tasks = [
+        ensure_future(start_producer(1, stop_event)),
+        ensure_future(start_consumer(config.concurrency, stop_event)),
+    ]
+    # progress is taken from metric, so benchmark itself doesn't run queries meanwhile
+    try:
+        while get_amount(tasks_written) - results < config.urls:
+            assert time.monotonic() - start_time < timeout, "benchmark is too slow"
+            await sleep(0.05)
+    finally:
+        duration = time.monotonic() - start_time
+        stop_event.set()
+        await gather(*tasks)
+
+    crud_calls = get_amount(db_statement_duration) - crud_calls
+    # statistics of producer's and consumer's connections are flushed when they're closed
+    backend_queries = 1
+    while await db_connection.fetchval(GET_AMOUNT_OF_BACKENDS) > backends:
+        backend_queries += 1
+        await sleep(0.05)
+
+    own_transactions = 2 + backend_queries
+    db_transactions = await get_amount_of_db_transactions(db_connection) - db_transactions - own_transactions
+
+    return BenchmarkResult(
+        checks=await db_connection.fetchval(GET_AMOUNT_OF_RESULTS),
+        errors=await db_connection.fetchval(GET_AMOUNT_OF_ERRORS),
+        duration=duration,
+        lag_percentiles=await db_connection.fetchval(GET_LAG_PERCENTILES),
+        db_transactions=db_transactions,
+        crud_calls=crud_calls,
+    )
+
+
+@pytest.mark.usefixtures("_create_tables", "stub_server")
+@pytest.mark.parametrize(
+    "config",
+    [
+        BenchmarkConfig(
+            urls=20,
+            latency=0.01,
+            body_size=1024,
+            error_rate=0.25,
+            concurrency=5,
+            timeout_rate=0.1,
+            reset_rate=0.1,
+            request_timeout=1,
+        ),
+    ],
+)
+async def test_benchmark_harness(db_connection: Connection, monkeypatch: MonkeyPatch, config: BenchmarkConfig) -> None:
+    result = await run_benchmark(db_connection, monkeypatch, config, timeout=30)
+
+    assert result.checks == config.urls
+    assert result.errors == round(config.urls * (config.error_rate + config.timeout_rate + config.reset_rate))
+    assert result.db_transactions > 0
+    assert result.crud_calls > 0
+    assert 0 < result.lag_percentiles[0] <= result.lag_percentiles[2]
+
+
+@pytest.mark.benchmark
+@pytest.mark.usefixtures("_create_tables", "stub_server")
+@pytest.mark.parametrize("config", [BenchmarkConfig.from_env()])
+async def test_benchmark(
+    db_connection: Connection,
+    monkeypatch: MonkeyPatch,
+    capsys: CaptureFixture,
+    config: BenchmarkConfig,
+) -> None:
+    timeout = float(os.environ.get("BENCHMARK_TIMEOUT", 600))
+    result = await run_benchmark(db_connection, monkeypatch, config, timeout)
+
+    with capsys.disabled():
+        print(f"\n{config}\n{result.report()}")  # noqa: T201
+
+    assert result.checks == config.urls
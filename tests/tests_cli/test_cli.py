@@ -88,6 +88,14 @@ def test_valid_args(args: list[str]) -> None:
                 "-r (.*",
             ],
         ),
+        (
+            [
+                "add",
+                "http://test.com",
+                "-m",
+                "post",
+            ],
+        ),
     ],
 )
 def test_invalid_args(args: list[str]) -> None:
@@ -116,9 +124,30 @@ def test_invalid_args(args: list[str]) -> None:
             None,
             15,
             [
-                {"id": 1, "last_run_at": None, "period": 5, "regex": None, "url": "https://test.com"},
-                {"id": 2, "last_run_at": None, "period": 5, "regex": None, "url": "https://test1.com"},
-                {"id": 3, "last_run_at": None, "period": 15, "regex": None, "url": "http://test2.com"},
+                {
+                    "check_mode": "full",
+                    "id": 1,
+                    "last_run_at": None,
+                    "period": 5,
+                    "regex": None,
+                    "url": "https://test.com",
+                },
+                {
+                    "check_mode": "full",
+                    "id": 2,
+                    "last_run_at": None,
+                    "period": 5,
+                    "regex": None,
+                    "url": "https://test1.com",
+                },
+                {
+                    "check_mode": "full",
+                    "id": 3,
+                    "last_run_at": None,
+                    "period": 15,
+                    "regex": None,
+                    "url": "http://test2.com",
+                },
             ],
         ),
     ],
@@ -141,6 +170,7 @@ async def test_add_url(
     for row in await db_connection.fetch(GET_URLS):
         row_result = dict(row)
         del row_result["created_at"]
+        del row_result["next_run_at"]
         result.append(row_result)
 
     assert result == expected_result
@@ -230,7 +260,16 @@ async def test_add_url_with_exception(
             ],
             "https://test.com",
             None,
-            [{"id": 4, "last_run_at": None, "period": 5, "regex": None, "url": "https://test1.com"}],
+            [
+                {
+                    "check_mode": "full",
+                    "id": 4,
+                    "last_run_at": None,
+                    "period": 5,
+                    "regex": None,
+                    "url": "https://test1.com",
+                },
+            ],
         ),
         (
             [
@@ -258,9 +297,30 @@ async def test_add_url_with_exception(
             "https://test.com",
             "test",
             [
-                {"id": 1, "last_run_at": None, "period": 5, "regex": ".*", "url": "https://test.com"},
-                {"id": 2, "last_run_at": None, "period": 5, "regex": None, "url": "https://test.com"},
-                {"id": 4, "last_run_at": None, "period": 5, "regex": "test", "url": "https://test1.com"},
+                {
+                    "check_mode": "full",
+                    "id": 1,
+                    "last_run_at": None,
+                    "period": 5,
+                    "regex": ".*",
+                    "url": "https://test.com",
+                },
+                {
+                    "check_mode": "full",
+                    "id": 2,
+                    "last_run_at": None,
+                    "period": 5,
+                    "regex": None,
+                    "url": "https://test.com",
+                },
+                {
+                    "check_mode": "full",
+                    "id": 4,
+                    "last_run_at": None,
+                    "period": 5,
+                    "regex": "test",
+                    "url": "https://test1.com",
+                },
             ],
         ),
     ],
@@ -282,6 +342,45 @@ async def test_remove_url(
     for row in await db_connection.fetch(GET_URLS):
         row_result = dict(row)
         del row_result["created_at"]
+        del row_result["next_run_at"]
         result.append(row_result)
 
     assert result == expected_result
+
+
+@pytest.mark.parametrize(
+    ("args", "expected_mode"),
+    [
+        (["add", "http://test.com"], "full"),
+        (["add", "http://test.com", "-m", "status-only"], "status-only"),
+        (["add", "http://test.com", "--mode", "head"], "head"),
+    ],
+)
+def test_mode_args(args: list[str], expected_mode: str) -> None:
+    assert parser.parse_args(args).mode == expected_mode
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("new_regex", "check_mode", "expected_result"),
+    [
+        (None, "status-only", [{"check_mode": "status-only", "regex": None, "url": "http://test.com"}]),
+        (None, "head", [{"check_mode": "head", "regex": None, "url": "http://test.com"}]),
+        ("test", "full", [{"check_mode": "full", "regex": "test", "url": "http://test.com"}]),
+        ("test", "head", []),
+    ],
+)
+async def test_add_url_with_mode(
+    db_connection: Connection,
+    new_regex: str | None,
+    check_mode: str,
+    expected_result: list[dict[str, Any]],
+) -> None:
+    if expected_result:
+        await add_url("http://test.com", 15, new_regex, check_mode)
+    else:
+        with pytest.raises(ArgumentTypeError):
+            await add_url("http://test.com", 15, new_regex, check_mode)
+
+    result = [dict(row) for row in await db_connection.fetch("SELECT url, regex, check_mode FROM url")]
+    assert result == expected_result
@@ -2,10 +2,12 @@ from asyncio import Event, ensure_future, gather, sleep
 from typing import Any
 
 import pytest
+from _pytest.monkeypatch import MonkeyPatch
 from asyncpg import Connection
 
-from aiven.consumer.worker import start_workers
-from aiven.db.crud import create_next_task
+from aiven.consumer.worker import group_tasks, send_request, start_workers
+from aiven.db.crud import create_next_task, get_next_tasks
+from conf.config_consumer import settings
 
 GET_TASKS = """
 SELECT * FROM task;
@@ -15,6 +17,17 @@ GET_TASKS_RESULT = """
 SELECT * FROM task_result;
 """
 
+TIMING_COLUMNS = [
+    "timestamp",
+    "response_time",
+    "queue_time",
+    "connection_wait_time",
+    "dns_time",
+    "connect_time",
+    "first_byte_time",
+    "download_time",
+]
+
 
 @pytest.mark.usefixtures("_create_tables", "web_client")
 @pytest.mark.parametrize(
@@ -37,7 +50,17 @@ SELECT * FROM task_result;
                     200,
                 ),
             ],
-            [{"id": 1, "regex": None, "status": 2, "url": "http://127.0.0.1:8080/test/"}],
+            [
+                {
+                    "attempts": 1,
+                    "check_mode": "full",
+                    "id": 1,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 2,
+                    "url": "http://127.0.0.1:8080/test/",
+                },
+            ],
             [
                 {
                     "error_text": "",
@@ -66,7 +89,17 @@ SELECT * FROM task_result;
                     200,
                 ),
             ],
-            [{"id": 1, "regex": None, "status": 2, "url": "http://127.0.0.1:8080/non_existent_path/"}],
+            [
+                {
+                    "attempts": 1,
+                    "check_mode": "full",
+                    "id": 1,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 2,
+                    "url": "http://127.0.0.1:8080/non_existent_path/",
+                },
+            ],
             [
                 {
                     "error_text": (
@@ -98,7 +131,17 @@ SELECT * FROM task_result;
                     200,
                 ),
             ],
-            [{"id": 1, "regex": "test", "status": 2, "url": "http://127.0.0.1:8080/test/"}],
+            [
+                {
+                    "attempts": 1,
+                    "check_mode": "full",
+                    "id": 1,
+                    "lease_until": None,
+                    "regex": "test",
+                    "status": 2,
+                    "url": "http://127.0.0.1:8080/test/",
+                },
+            ],
             [
                 {
                     "error_text": "",
@@ -127,7 +170,17 @@ SELECT * FROM task_result;
                     500,
                 ),
             ],
-            [{"id": 1, "regex": "test", "status": 2, "url": "http://127.0.0.1:8080/test/"}],
+            [
+                {
+                    "attempts": 1,
+                    "check_mode": "full",
+                    "id": 1,
+                    "lease_until": None,
+                    "regex": "test",
+                    "status": 2,
+                    "url": "http://127.0.0.1:8080/test/",
+                },
+            ],
             [
                 {
                     "error_text": (
@@ -165,6 +218,7 @@ async def test_consumer(
     for row in await db_connection.fetch(GET_TASKS):
         row_result = dict(row)
         del row_result["created_at"]
+        del row_result["claimed_at"]
         result.append(row_result)
 
     assert sorted(result, key=lambda x: x["id"]) == expected_task
@@ -172,9 +226,167 @@ async def test_consumer(
     result = []
     for row in await db_connection.fetch(GET_TASKS_RESULT):
         row_result = dict(row)
-        del row_result["timestamp"]
-        del row_result["response_time"]
+        for column in TIMING_COLUMNS:
+            del row_result[column]
         del row_result["id"]
         result.append(row_result)
 
     assert sorted(result, key=lambda x: x["url"]) == expected_task_result
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("rows", "sleep_without_task", "expected_statuses"),
+    [
+        (
+            [
+                (
+                    "http://127.0.0.1:1/",
+                    None,
+                ),
+                (
+                    "http://127.0.0.1:1/",
+                    "test",
+                ),
+            ],
+            3,
+            [{"id": 1, "status": 2}, {"id": 2, "status": 2}],
+        ),
+    ],
+)
+async def test_consumer_wakes_up_on_new_tasks(
+    monkeypatch: MonkeyPatch,
+    db_connection: Connection,
+    rows: list[tuple[str, str | None]],
+    sleep_without_task: int,
+    expected_statuses: list[dict[str, Any]],
+) -> None:
+    monkeypatch.setattr(settings, "SLEEP_WITHOUT_TASK", sleep_without_task)
+    monkeypatch.setattr(settings, "RESULT_FLUSH_INTERVAL", 0.1)
+
+    stop_event = Event()
+    tasks = [ensure_future(start_workers(2, stop_event))]
+    await sleep(0.5)
+
+    for row in rows:
+        url, regex = row
+        await create_next_task(db_connection, url, regex)
+
+    # much less than SLEEP_WITHOUT_TASK, so tasks can be claimed only after notification
+    await sleep(1)
+    result = [dict(row) for row in await db_connection.fetch("SELECT id, status FROM task ORDER BY id")]
+
+    stop_event.set()
+    await gather(*tasks)
+
+    assert result == expected_statuses
+
+
+@pytest.mark.usefixtures("_create_tables", "web_client")
+@pytest.mark.parametrize(
+    ("stream_body", "endpoints", "expected_task_result"),
+    [
+        (
+            stream_body,
+            [("get", "/test/", {"Content-type": "text/html"}, "test 123", 200)],
+            [
+                {"regex_is_found": False, "regex_result": "", "task_id": 1},
+                {"regex_is_found": True, "regex_result": "test", "task_id": 2},
+                {"regex_is_found": True, "regex_result": "123", "task_id": 3},
+                {"regex_is_found": False, "regex_result": "", "task_id": 4},
+            ],
+        )
+        for stream_body in (False, True)
+    ],
+)
+async def test_consumer_fetches_url_once(
+    monkeypatch: MonkeyPatch,
+    db_connection: Connection,
+    stream_body: bool,
+    expected_task_result: list[dict[str, Any]],
+) -> None:
+    monkeypatch.setattr(settings, "STREAM_BODY", stream_body)
+    requests = []
+
+    async def counted_send_request(*args: Any) -> Any:
+        requests.append(args[1])
+        return await send_request(*args)
+
+    monkeypatch.setattr("aiven.consumer.worker.send_request", counted_send_request)
+    for regex in (None, "test", r"\d+", "missing"):
+        await create_next_task(db_connection, "http://127.0.0.1:8080/test/", regex)
+
+    stop_event = Event()
+    tasks = [ensure_future(start_workers(2, stop_event))]
+    await sleep(1)
+    stop_event.set()
+    await gather(*tasks)
+
+    assert requests == ["http://127.0.0.1:8080/test/"]
+    result = [
+        {"regex_is_found": row["regex_is_found"], "regex_result": row["regex_result"], "task_id": row["task_id"]}
+        for row in await db_connection.fetch(GET_TASKS_RESULT)
+    ]
+    assert sorted(result, key=lambda x: x["task_id"]) == expected_task_result
+    assert len({row["response_time"] for row in await db_connection.fetch(GET_TASKS_RESULT)}) == 1
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("rows", "claim_time", "expected_statuses"),
+    [
+        (
+            [("http://127.0.0.1:1/", None), ("http://127.0.0.1:1/", "test")],
+            0.5,
+            [{"id": 1, "status": 2}, {"id": 2, "status": 2}],
+        ),
+    ],
+)
+async def test_consumer_drains_last_claim_on_stop(
+    monkeypatch: MonkeyPatch,
+    db_connection: Connection,
+    rows: list[tuple[str, str | None]],
+    claim_time: float,
+    expected_statuses: list[dict[str, Any]],
+) -> None:
+    monkeypatch.setattr(settings, "SLEEP_WITHOUT_TASK", 0.1)
+    monkeypatch.setattr(settings, "RESULT_FLUSH_INTERVAL", 0.1)
+    stop_event = Event()
+
+    async def slow_get_next_tasks(*args: Any) -> Any:
+        # stop is requested while claimer is inside get_next_tasks, workers wait much longer than SLEEP_WITHOUT_TASK
+        stop_event.set()
+        await sleep(claim_time)
+        return await get_next_tasks(*args)
+
+    monkeypatch.setattr("aiven.consumer.worker.get_next_tasks", slow_get_next_tasks)
+    for url, regex in rows:
+        await create_next_task(db_connection, url, regex)
+
+    await start_workers(2, stop_event)
+
+    assert [dict(row) for row in await db_connection.fetch("SELECT id, status FROM task ORDER BY id")] == (
+        expected_statuses
+    )
+
+
+@pytest.mark.parametrize(
+    ("tasks", "expected_result"),
+    [
+        (
+            [
+                {"id": 1, "url": "http://test.com", "regex": None, "check_mode": "full"},
+                {"id": 2, "url": "http://test1.com", "regex": "test", "check_mode": "full"},
+                {"id": 3, "url": "http://test.com", "regex": "test", "check_mode": "full"},
+                {"id": 4, "url": "http://test.com", "regex": None, "check_mode": "head"},
+            ],
+            [
+                ("http://test.com", "full", [(1, None), (3, "test")]),
+                ("http://test1.com", "full", [(2, "test")]),
+                ("http://test.com", "head", [(4, None)]),
+            ],
+        ),
+    ],
+)
+def test_group_tasks(tasks: list[dict[str, Any]], expected_result: list[tuple[str, str, list]]) -> None:
+    assert group_tasks(tasks) == expected_result
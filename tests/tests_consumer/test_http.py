@@ -0,0 +1,147 @@
+import time
+from asyncio import sleep
+from collections.abc import Generator
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from aiven.consumer.http import get_http_session
+from aiven.consumer.worker import fetch_url
+from conf.config_consumer import settings
+
+
+@pytest.mark.parametrize(
+    ("limit", "limit_per_host"),
+    [
+        (100, 0),
+        (10, 2),
+    ],
+)
+async def test_get_http_session(monkeypatch: MonkeyPatch, limit: int, limit_per_host: int) -> None:
+    monkeypatch.setattr(settings, "HTTP_LIMIT", limit)
+    monkeypatch.setattr(settings, "HTTP_LIMIT_PER_HOST", limit_per_host)
+
+    async with get_http_session() as session:
+        assert session.connector.limit == limit
+        assert session.connector.limit_per_host == limit_per_host
+        assert session.timeout.total == settings.HTTP_REQUEST_TIMEOUT
+
+    assert session.closed
+
+
+@pytest.mark.usefixtures("web_client")
+@pytest.mark.parametrize(
+    "endpoints",
+    [
+        [("get", "/test/", {"Content-type": "text/html"}, "test", 200)],
+    ],
+)
+async def test_request_timings() -> None:
+    async with get_http_session() as session:
+        first_result = await fetch_url(session, 1, "http://127.0.0.1:8080/test/", "test", claimed_at=time.monotonic())
+        second_result = await fetch_url(session, 2, "http://127.0.0.1:8080/test/", "test")
+
+    assert first_result.regex_is_found
+    # ip address isn't resolved
+    assert first_result.dns_time is None
+    assert first_result.connect_time > 0
+    assert first_result.queue_time > 0
+    for result in (first_result, second_result):
+        assert result.first_byte_time > 0
+        assert result.download_time > 0
+        assert result.response_time >= result.first_byte_time + result.download_time
+        assert result.connection_wait_time is None
+
+    # connection is reused
+    assert second_result.connect_time is None
+    assert second_result.queue_time is None
+
+
+@pytest.mark.usefixtures("web_client")
+@pytest.mark.parametrize(
+    "endpoints",
+    [
+        [("get", "/test/", {"Content-type": "text/html"}, "test", 200)],
+    ],
+)
+async def test_request_timings_with_dns() -> None:
+    async with get_http_session() as session:
+        result = await fetch_url(session, 1, "http://localhost:8080/test/", None)
+
+    assert result.status_code == 200
+    assert result.dns_time > 0
+    assert result.connect_time > 0
+
+
+@pytest.fixture()
+async def redirect_server() -> Generator[TestServer, None, None]:
+    """Redirects from 127.0.0.1 to localhost, so every hop has its own connection. Every hop responds after 0.05 s."""
+
+    async def redirect(request: web.Request) -> web.Response:
+        await sleep(0.05)
+        raise web.HTTPFound("http://localhost:8080/test/")
+
+    async def respond(request: web.Request) -> web.Response:
+        await sleep(0.05)
+        return web.Response(text="test", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/redirect/", redirect)
+    app.router.add_get("/test/", respond)
+    server = TestServer(app, host="127.0.0.1", port=8080)
+    await server.start_server()
+    yield server
+    await server.close()
+
+
+@pytest.mark.usefixtures("redirect_server")
+async def test_request_timings_with_redirect() -> None:
+    async with get_http_session() as session:
+        result = await fetch_url(session, 1, "http://127.0.0.1:8080/redirect/", "test")
+
+    assert (result.status_code, result.regex_is_found) == (200, True)
+    # both hops are counted
+    assert result.first_byte_time >= 0.1
+    assert result.response_time >= result.first_byte_time
+    assert result.dns_time > 0
+    assert result.connect_time > 0
+
+
+@pytest.mark.usefixtures("web_client")
+@pytest.mark.parametrize(
+    ("check_mode", "endpoints", "expected_result"),
+    [
+        (
+            "full",
+            [("get", "/test/", {"Content-type": "text/html"}, "test", 200)],
+            (200, True, ""),
+        ),
+        (
+            "status-only",
+            [("get", "/test/", {"Content-type": "text/html"}, "test", 200)],
+            (200, False, ""),
+        ),
+        (
+            "status-only",
+            [("get", "/test/", {"Content-type": "text/html"}, "test " * 100000, 200)],
+            (200, False, ""),
+        ),
+        (
+            "head",
+            [("head", "/test/", {"Content-type": "text/html"}, "", 200)],
+            (200, False, ""),
+        ),
+        (
+            "head",
+            [("head", "/test/", {"Content-type": "text/html"}, "", 404)],
+            (404, False, "ClientResponseError: 404, message='Not Found', url=URL('http://127.0.0.1:8080/test/')"),
+        ),
+    ],
+)
+async def test_fetch_url_check_mode(check_mode: str, expected_result: tuple[int, bool, str]) -> None:
+    async with get_http_session() as session:
+        for task_id in range(2):
+            result = await fetch_url(session, task_id, "http://127.0.0.1:8080/test/", "test", check_mode=check_mode)
+            assert (result.status_code, result.regex_is_found, result.error_text) == expected_result
@@ -0,0 +1,236 @@
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from aiven.consumer.http import get_http_session
+from aiven.consumer.matcher import RegexCache, StreamMatcher, get_bytes_regex
+from aiven.consumer.worker import compile_regexes, fetch_url
+from conf.config_consumer import settings
+
+
+@pytest.mark.parametrize(
+    ("regex", "text", "chunk_size", "overlap", "find_all", "expected_results"),
+    [
+        ("test", "test one test two test", 1, 4, True, ["test", "test", "test"]),
+        ("test", "test one test two test", 3, 4, True, ["test", "test", "test"]),
+        ("test", "test one test two test", 100, 4, True, ["test", "test", "test"]),
+        ("test", "test one test two test", 3, 4, False, ["test"]),
+        (r"t(\w+)t", "tex one text two", 2, 8, True, ["ex"]),
+        (r"\d+", "12 345 6789", 2, 8, True, ["12", "345", "6789"]),
+        ("missing", "test one test two test", 5, 10, True, []),
+        # match longer than overlap window is cut
+        ("a+", "aaaaaaaa", 2, 2, True, ["aaaa"]),
+    ],
+)
+def test_stream_matcher(
+    regex: str,
+    text: str,
+    chunk_size: int,
+    overlap: int,
+    find_all: bool,
+    expected_results: list[str],
+) -> None:
+    matcher = StreamMatcher(regex, overlap, find_all)
+    for start in range(0, len(text), chunk_size):
+        matcher.feed(text[start : start + chunk_size])
+        if matcher.done:
+            break
+
+    assert matcher.close() == expected_results
+
+
+@pytest.mark.usefixtures("web_client")
+@pytest.mark.parametrize(
+    ("regex", "max_body_size", "find_all", "endpoints", "expected_result"),
+    [
+        (
+            "test",
+            1000,
+            True,
+            [("get", "/test/", {"Content-type": "text/html"}, "test " * 100, 200)],
+            ("; ".join(["test"] * 100), True, ""),
+        ),
+        (
+            "test",
+            1000,
+            False,
+            [("get", "/test/", {"Content-type": "text/html"}, "test " * 100, 200)],
+            ("test", True, ""),
+        ),
+        (
+            "test",
+            12,
+            True,
+            [("get", "/test/", {"Content-type": "text/html"}, "test " * 100, 200)],
+            ("test; test", True, "BodyTooLarge: body is bigger than 12 bytes"),
+        ),
+        (
+            "missing",
+            1000,
+            True,
+            [("get", "/test/", {"Content-type": "text/html; charset=cp1251"}, "test " * 100, 200)],
+            ("", False, ""),
+        ),
+    ],
+)
+async def test_fetch_url_stream(
+    monkeypatch: MonkeyPatch,
+    regex: str,
+    max_body_size: int,
+    find_all: bool,
+    expected_result: tuple[str, bool, str],
+) -> None:
+    monkeypatch.setattr(settings, "STREAM_BODY", True)
+    monkeypatch.setattr(settings, "STREAM_CHUNK_SIZE", 7)
+    monkeypatch.setattr(settings, "MAX_BODY_SIZE", max_body_size)
+    monkeypatch.setattr(settings, "FIND_ALL_MATCHES", find_all)
+
+    async with get_http_session() as session:
+        result = await fetch_url(session, 1, "http://127.0.0.1:8080/test/", regex)
+
+    assert (result.regex_result, result.regex_is_found, result.error_text) == expected_result
+
+
+@pytest.mark.parametrize(
+    ("regex", "encoding", "expected_regex"),
+    [
+        ("test", "utf-8", b"test"),
+        (r"[0-9]+\.com", "cp1251", rb"[0-9]+\.com"),
+        (r"\w+", "utf-8", None),
+        ("(?i)test", "utf-8", None),
+        ("тест", "utf-8", None),
+        ("test", "utf-16", None),
+        ("test", "unknown", None),
+        ("(?u)abc", "utf-8", None),
+        (r"\N{LATIN SMALL LETTER A}bc", "utf-8", None),
+        (r"\u00e9t\u00e9", "utf-8", None),
+        (r"\xe9t\xe9", "latin-1", None),
+        ("[^<]{2}x", "utf-8", None),
+        ("a.c", "utf-8", None),
+        (r"a\\.c", "utf-8", None),
+        ("(", "utf-8", None),
+    ],
+)
+def test_get_bytes_regex(regex: str, encoding: str, expected_regex: bytes | None) -> None:
+    assert get_bytes_regex(regex, encoding) == expected_regex
+
+
+@pytest.mark.usefixtures("web_client")
+@pytest.mark.parametrize("stream_body", [True, False])
+@pytest.mark.parametrize("bytes_regex", [True, False])
+@pytest.mark.parametrize(
+    ("regex", "endpoints", "expected_result"),
+    [
+        (
+            "[0-9]+",
+            [("get", "/test/", {"Content-type": "text/html; charset=utf-8"}, "цена: 100 руб, 200 руб", 200)],
+            ("100; 200", True),
+        ),
+        (
+            "([0-9]+) руб",
+            [("get", "/test/", {"Content-type": "text/html; charset=utf-8"}, "цена: 100 руб, 200 руб", 200)],
+            ("100; 200", True),
+        ),
+        (
+            "missing",
+            [("get", "/test/", {"Content-type": "text/html"}, "цена: 100 руб, 200 руб", 200)],
+            ("", False),
+        ),
+        (
+            r"\xe9t\xe9",
+            [("get", "/test/", {"Content-type": "text/html; charset=utf-8"}, "été", 200)],
+            ("été", True),
+        ),
+        (
+            "[^<]{2}x",
+            [("get", "/test/", {"Content-type": "text/html; charset=utf-8"}, "<ыx", 200)],
+            ("", False),
+        ),
+        (
+            r"\N{LATIN SMALL LETTER A}bc",
+            [("get", "/test/", {"Content-type": "text/html; charset=utf-8"}, "abc", 200)],
+            ("abc", True),
+        ),
+    ],
+)
+async def test_fetch_url_bytes_regex(
+    monkeypatch: MonkeyPatch,
+    stream_body: bool,
+    bytes_regex: bool,
+    regex: str,
+    expected_result: tuple[str, bool],
+) -> None:
+    monkeypatch.setattr(settings, "STREAM_BODY", stream_body)
+    monkeypatch.setattr(settings, "STREAM_CHUNK_SIZE", 5)
+    monkeypatch.setattr(settings, "BYTES_REGEX", bytes_regex)
+
+    async with get_http_session() as session:
+        result = await fetch_url(session, 1, "http://127.0.0.1:8080/test/", regex)
+
+    assert (result.regex_result, result.regex_is_found, result.error_text) == (*expected_result, "")
+
+
+@pytest.mark.usefixtures("web_client")
+@pytest.mark.parametrize("stream_body", [True, False])
+@pytest.mark.parametrize("bytes_regex", [True, False])
+@pytest.mark.parametrize(
+    "endpoints",
+    [[("get", "/test/", {"Content-type": "text/html; charset=utf-8"}, "test", 200)]],
+)
+async def test_fetch_url_invalid_regex(monkeypatch: MonkeyPatch, stream_body: bool, bytes_regex: bool) -> None:
+    monkeypatch.setattr(settings, "STREAM_BODY", stream_body)
+    monkeypatch.setattr(settings, "BYTES_REGEX", bytes_regex)
+
+    async with get_http_session() as session:
+        result = await fetch_url(session, 1, "http://127.0.0.1:8080/test/", "(")
+
+    assert (result.status_code, result.regex_is_found) == (200, False)
+    assert result.error_text.endswith("missing ), unterminated subpattern at position 0")
+
+
+@pytest.mark.parametrize(
+    ("size", "regexes", "expected_hits", "expected_misses", "expected_size"),
+    [
+        (2, ["a", "b", "a", "b"], 2, 2, 2),
+        (2, ["a", "b", "c", "a"], 0, 4, 2),
+        (2, ["a", "b", "a", "c", "a"], 2, 3, 2),
+        (10, ["a", b"a", "a", b"a"], 2, 2, 2),
+    ],
+)
+def test_regex_cache(
+    size: int,
+    regexes: list[str | bytes],
+    expected_hits: int,
+    expected_misses: int,
+    expected_size: int,
+) -> None:
+    cache = RegexCache(size)
+    for regex in regexes:
+        assert cache.get(regex).pattern == regex
+
+    assert (cache.hits, cache.misses, len(cache)) == (expected_hits, expected_misses, expected_size)
+
+
+@pytest.mark.parametrize(
+    ("bytes_regex", "tasks", "expected_hits", "expected_misses", "expected_size"),
+    [
+        (False, [(1, "http://test.com", "test"), (2, "http://test.com", None)], 0, 1, 1),
+        (True, [(1, "http://test.com", "test"), (2, "http://test.com", "test")], 2, 2, 2),
+        # invalid regex isn't cached
+        (True, [(1, "http://test.com", r"\w+"), (2, "http://test.com", "[")], 0, 2, 1),
+    ],
+)
+def test_compile_regexes(
+    monkeypatch: MonkeyPatch,
+    bytes_regex: bool,
+    tasks: list[tuple[int, str, str | None]],
+    expected_hits: int,
+    expected_misses: int,
+    expected_size: int,
+) -> None:
+    cache = RegexCache(10)
+    monkeypatch.setattr("aiven.consumer.worker.regex_cache", cache)
+    monkeypatch.setattr(settings, "BYTES_REGEX", bytes_regex)
+
+    compile_regexes([{"id": task_id, "url": url, "regex": regex} for task_id, url, regex in tasks])
+
+    assert (cache.hits, cache.misses, len(cache)) == (expected_hits, expected_misses, expected_size)
@@ -0,0 +1,88 @@
+import re
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from aiven.consumer.http import get_http_session
+from aiven.consumer.prefilter import Prefilter, get_prefilter_expression, is_utf8
+from aiven.consumer.worker import fetch_url_tasks
+from conf.config_consumer import settings
+
+pytest.importorskip("hyperscan")
+
+REGEXES = ["test", None, r"(\d+)", "missing", r"(?P<x>t)(?P=x)", r"(?a)\w+", r"тест\b", "x*"]
+
+
+@pytest.mark.parametrize(
+    ("encoding", "expected_result"),
+    [
+        ("utf-8", True),
+        ("UTF8", True),
+        ("ascii", True),
+        ("cp1251", False),
+        ("unknown", False),
+    ],
+)
+def test_is_utf8(encoding: str, expected_result: bool) -> None:
+    assert is_utf8(encoding) == expected_result
+
+
+@pytest.mark.parametrize(
+    ("regex", "expected_expression"),
+    [
+        ("a{,3}b", "a{0,3}b"),
+        (r"a\{,3}", r"a\{,3}"),
+        ("[{,3}]", "[{,3}]"),
+        (r"\d+", r"[\x30-\x39\x{80}-\x{10ffff}]+"),
+        (r"[\s.]", r"[\x09-\x0d\x1c-\x20\x{80}-\x{10ffff}.]"),
+        (r"[]\S]", r"[]\x00-\x08\x0e-\x1b\x21-\x{10ffff}]"),
+        (r"\btest\B", "test"),
+        (r"[\b]", r"[\b]"),
+        (r"[^\w]", None),
+        (r"[^]\d]", None),
+        ("(?i)тест", None),
+        ("(?x)a # [", None),
+    ],
+)
+def test_get_prefilter_expression(regex: str, expected_expression: str | None) -> None:
+    assert get_prefilter_expression(regex) == expected_expression
+
+
+@pytest.mark.parametrize(
+    ("regexes", "body", "expected_result"),
+    [
+        # (?a) isn't supported by hyperscan, so it's always matched by re
+        (REGEXES, "test 123 тест", {0, 2, 5, 6, 7}),
+        (REGEXES, "", {5, 7}),
+        (["test", "missing"], "test", {0}),
+        # python only syntax and characters which are newer than unicode tables of hyperscan
+        (["a{,3}b", r"\d{,2}3", "missing"], "aab 123", {0, 1}),
+        ([r"\d", r"\w\b", r"\s", r"[^\s]", r"\W", "missing"], "\U00010d30\x1c\u1885", {0, 1, 2, 3, 4}),
+    ],
+)
+def test_get_candidates(regexes: list[str | None], body: str, expected_result: set[int]) -> None:
+    prefilter = Prefilter(10)
+    assert prefilter.get_candidates(regexes, body.encode()) == expected_result
+    # regexes which really match are always candidates
+    assert {index for index, regex in enumerate(regexes) if regex and re.search(regex, body)} <= expected_result
+
+
+@pytest.mark.usefixtures("web_client")
+@pytest.mark.parametrize("bytes_regex", [True, False])
+@pytest.mark.parametrize(
+    "endpoints",
+    [
+        [("get", "/test/", {"Content-type": "text/html; charset=utf-8"}, "test 123 тест ttt", 200)],
+        [("get", "/test/", {"Content-type": "text/html; charset=cp1251"}, "test 123", 200)],
+    ],
+)
+async def test_fetch_url_tasks_prefilter(monkeypatch: MonkeyPatch, bytes_regex: bool) -> None:
+    monkeypatch.setattr(settings, "BYTES_REGEX", bytes_regex)
+    tasks = list(enumerate(REGEXES))
+    async with get_http_session() as session:
+        expected_results = await fetch_url_tasks(session, "http://127.0.0.1:8080/test/", tasks)
+        results = await fetch_url_tasks(session, "http://127.0.0.1:8080/test/", tasks, prefilter=Prefilter(10))
+
+    assert [(result.regex_result, result.regex_is_found, result.error_text) for result in results] == [
+        (result.regex_result, result.regex_is_found, result.error_text) for result in expected_results
+    ]
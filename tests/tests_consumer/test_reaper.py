@@ -0,0 +1,103 @@
+from typing import Any
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from asyncpg import Connection, Pool
+
+from aiven.consumer.reaper import reap_tasks
+from aiven.db.crud import create_next_task, get_next_tasks
+from conf.config_consumer import settings
+
+GET_TASKS = """
+SELECT id, status, attempts, lease_until FROM task ORDER BY id;
+"""
+
+GET_TASKS_RESULT = """
+SELECT task_id, status_code, error_text, regex_is_found FROM task_result ORDER BY task_id;
+"""
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("amount_of_tasks", "lease_times", "reaper_batch_size", "expected_amount", "expected_tasks", "expected_results"),
+    [
+        (
+            2,
+            [0],
+            1,
+            2,
+            [
+                {"attempts": 1, "id": 1, "lease_until": None, "status": 0},
+                {"attempts": 1, "id": 2, "lease_until": None, "status": 0},
+            ],
+            [],
+        ),
+        (
+            2,
+            [0, 0],
+            10,
+            2,
+            [
+                {"attempts": 2, "id": 1, "lease_until": None, "status": 3},
+                {"attempts": 2, "id": 2, "lease_until": None, "status": 3},
+            ],
+            [
+                {
+                    "error_text": "LeaseExpired: task wasn't finished in 2 attempts",
+                    "regex_is_found": False,
+                    "status_code": 0,
+                    "task_id": 1,
+                },
+                {
+                    "error_text": "LeaseExpired: task wasn't finished in 2 attempts",
+                    "regex_is_found": False,
+                    "status_code": 0,
+                    "task_id": 2,
+                },
+            ],
+        ),
+        (
+            2,
+            [60],
+            10,
+            0,
+            [
+                {"attempts": 1, "id": 1, "status": 1},
+                {"attempts": 1, "id": 2, "status": 1},
+            ],
+            [],
+        ),
+    ],
+)
+async def test_reap_tasks(
+    monkeypatch: MonkeyPatch,
+    db_pool: Pool,
+    db_connection: Connection,
+    amount_of_tasks: int,
+    lease_times: list[int],
+    reaper_batch_size: int,
+    expected_amount: int,
+    expected_tasks: list[dict[str, Any]],
+    expected_results: list[dict[str, Any]],
+) -> None:
+    monkeypatch.setattr(settings, "MAX_TASK_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "REAPER_BATCH_SIZE", reaper_batch_size)
+    for _ in range(amount_of_tasks):
+        await create_next_task(db_connection, "http://test.com", None)
+
+    amount = 0
+    for lease_time in lease_times:
+        await get_next_tasks(db_connection, amount_of_tasks, lease_time)
+        amount = await reap_tasks(db_pool)
+
+    assert amount == expected_amount
+
+    result = []
+    for row in await db_connection.fetch(GET_TASKS):
+        row_result = dict(row)
+        if row_result["lease_until"] is not None:
+            del row_result["lease_until"]
+        result.append(row_result)
+
+    assert result == expected_tasks
+    assert [dict(row) for row in await db_connection.fetch(GET_TASKS_RESULT)] == expected_results
@@ -0,0 +1,90 @@
+from asyncio import gather
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from aiven.consumer.http import get_http_session
+from aiven.consumer.regex_pool import RegexPool, RegexTimeoutError
+from aiven.consumer.worker import fetch_url
+from conf.config_consumer import settings
+
+# catastrophic backtracking
+SLOW_REGEX = r"(a+)+$"
+SLOW_BODY = b"a" * 40 + b"b"
+
+
+@pytest.mark.parametrize(
+    ("regex", "body", "encoding", "shared_memory_size", "expected_result"),
+    [
+        ("test", b"test one test", "utf-8", 1024, ["test", "test"]),
+        ("test", b"test one test", "utf-8", 1, ["test", "test"]),
+        (b"test", b"test one test", None, 1024, [b"test", b"test"]),
+        (b"t(es)t", b"test one test", None, 1, [b"es", b"es"]),
+        ("тест", "тест".encode("cp1251"), "cp1251", 1, ["тест"]),
+        ("test", b"", "utf-8", 1, []),
+    ],
+)
+async def test_regex_pool(
+    regex: str | bytes,
+    body: bytes,
+    encoding: str | None,
+    shared_memory_size: int,
+    expected_result: list[str | bytes],
+) -> None:
+    regex_pool = RegexPool(1, 5, shared_memory_size)
+    try:
+        assert await regex_pool.findall(regex, body, encoding) == expected_result
+    finally:
+        regex_pool.shutdown()
+
+
+@pytest.mark.parametrize("shared_memory_size", [1, 1024])
+async def test_regex_pool_timeout(shared_memory_size: int) -> None:
+    regex_pool = RegexPool(2, 0.5, shared_memory_size)
+    try:
+        results = await gather(
+            regex_pool.findall(SLOW_REGEX, SLOW_BODY, "utf-8"),
+            regex_pool.findall("b", SLOW_BODY, "utf-8"),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], RegexTimeoutError)
+        assert results[1] == ["b"]
+
+        # pool works after restart
+        assert await regex_pool.findall("b", SLOW_BODY, "utf-8") == ["b"]
+    finally:
+        regex_pool.shutdown()
+
+
+@pytest.mark.usefixtures("web_client")
+@pytest.mark.parametrize("bytes_regex", [True, False])
+@pytest.mark.parametrize(
+    ("regex", "endpoints", "expected_result"),
+    [
+        (
+            "test",
+            [("get", "/test/", {"Content-type": "text/html"}, "test one test", 200)],
+            ("test; test", True, ""),
+        ),
+        (
+            SLOW_REGEX,
+            [("get", "/test/", {"Content-type": "text/html"}, SLOW_BODY.decode(), 200)],
+            ("", False, "RegexTimeoutError: regex wasn't matched in 0.5 seconds"),
+        ),
+    ],
+)
+async def test_fetch_url_regex_pool(
+    monkeypatch: MonkeyPatch,
+    bytes_regex: bool,
+    regex: str,
+    expected_result: tuple[str, bool, str],
+) -> None:
+    monkeypatch.setattr(settings, "BYTES_REGEX", bytes_regex)
+    regex_pool = RegexPool(1, 0.5, 1)
+    try:
+        async with get_http_session() as session:
+            result = await fetch_url(session, 1, "http://127.0.0.1:8080/test/", regex, regex_pool)
+    finally:
+        regex_pool.shutdown()
+
+    assert (result.regex_result, result.regex_is_found, result.error_text) == expected_result
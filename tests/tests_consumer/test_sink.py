@@ -0,0 +1,134 @@
+from asyncio import Event, ensure_future, sleep, wait_for
+from datetime import datetime, timezone
+
+import pytest
+from asyncpg import Connection, Pool
+
+from aiven.consumer.sink import ResultSink
+from aiven.db.crud import TaskResult, create_next_task, get_next_tasks
+
+GET_TASKS = """
+SELECT id, status FROM task ORDER BY id;
+"""
+
+EXPIRE_LEASES = """
+UPDATE task SET lease_until = NOW() - INTERVAL '1 sec';
+"""
+
+REAP_TASKS = """
+UPDATE task SET status = $1, lease_until = NULL;
+"""
+
+GET_TASKS_RESULT = """
+SELECT task_id, status_code FROM task_result ORDER BY task_id;
+"""
+
+
+def make_result(task_id: int) -> TaskResult:
+    return TaskResult(
+        task_id=task_id,
+        url="http://test.com",
+        status_code=200,
+        response_time=0.1,
+        error_text="",
+        regex_is_found=False,
+        regex_result="",
+    )
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("amount_of_tasks", "batch_size", "flush_interval", "sleep_time", "expected_tasks", "expected_task_results"),
+    [
+        (
+            3,
+            2,
+            10,
+            0.5,
+            [{"id": 1, "status": 2}, {"id": 2, "status": 2}, {"id": 3, "status": 1}],
+            [{"status_code": 200, "task_id": 1}, {"status_code": 200, "task_id": 2}],
+        ),
+        (
+            3,
+            10,
+            0.1,
+            0.5,
+            [{"id": 1, "status": 2}, {"id": 2, "status": 2}, {"id": 3, "status": 2}],
+            [
+                {"status_code": 200, "task_id": 1},
+                {"status_code": 200, "task_id": 2},
+                {"status_code": 200, "task_id": 3},
+            ],
+        ),
+    ],
+)
+async def test_result_sink(
+    db_pool: Pool,
+    db_connection: Connection,
+    amount_of_tasks: int,
+    batch_size: int,
+    flush_interval: float,
+    sleep_time: float,
+    expected_tasks: list[dict],
+    expected_task_results: list[dict],
+) -> None:
+    for _ in range(amount_of_tasks):
+        await create_next_task(db_connection, "http://test.com", None)
+
+    sink = ResultSink(db_pool, batch_size=batch_size, flush_interval=flush_interval)
+    stop_event = Event()
+    sink_task = ensure_future(sink.run(stop_event))
+    for task in await get_next_tasks(db_connection, amount_of_tasks, 60):
+        await sink.put(make_result(task["id"]), task["claimed_at"])
+
+    await sleep(sleep_time)
+
+    assert [dict(row) for row in await db_connection.fetch(GET_TASKS)] == expected_tasks
+    assert [dict(row) for row in await db_connection.fetch(GET_TASKS_RESULT)] == expected_task_results
+
+    sink_task.cancel()
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("reaped_status", "reclaimed", "expected_status"),
+    [
+        # failed by reaper
+        (3, False, 3),
+        # requeued by reaper
+        (0, False, 0),
+        # requeued and claimed again
+        (0, True, 1),
+    ],
+)
+async def test_result_sink_drops_result_of_expired_lease(
+    db_pool: Pool,
+    db_connection: Connection,
+    reaped_status: int,
+    reclaimed: bool,
+    expected_status: int,
+) -> None:
+    await create_next_task(db_connection, "http://test.com", None)
+    (task,) = await get_next_tasks(db_connection, 1, 60)
+    await db_connection.execute(EXPIRE_LEASES)
+    await db_connection.execute(REAP_TASKS, reaped_status)
+    if reclaimed:
+        await get_next_tasks(db_connection, 1, 60)
+
+    sink = ResultSink(db_pool, flush_interval=0.1)
+    stop_event = Event()
+    await sink.put(make_result(task["id"]), task["claimed_at"])
+    stop_event.set()
+    await sink.run(stop_event)
+
+    assert [dict(row) for row in await db_connection.fetch(GET_TASKS)] == [{"id": 1, "status": expected_status}]
+    assert await db_connection.fetch(GET_TASKS_RESULT) == []
+
+
+async def test_result_sink_is_bounded(db_pool: Pool) -> None:
+    sink = ResultSink(db_pool, buffer_size=1)
+    claimed_at = datetime.now(timezone.utc)
+    await sink.put(make_result(1), claimed_at)
+
+    with pytest.raises(TimeoutError):
+        await wait_for(sink.put(make_result(2), claimed_at), timeout=0.1)
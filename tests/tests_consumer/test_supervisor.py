@@ -0,0 +1,104 @@
+import os
+import signal
+import sys
+import threading
+from asyncio import Event
+from pathlib import Path
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+
+from aiven.consumer.supervisor import STOP_SIGNALS, Supervisor, run_consumer
+from aiven.memory import MEMORY_SIGNAL
+from aiven.profiler import PROFILE_SIGNAL
+from conf.config_consumer import settings
+
+
+@pytest.fixture()
+def _restore_signals() -> None:
+    handlers = {
+        stop_signal: signal.getsignal(stop_signal) for stop_signal in (*STOP_SIGNALS, PROFILE_SIGNAL, MEMORY_SIGNAL)
+    }
+    yield
+    for stop_signal, handler in handlers.items():
+        signal.signal(stop_signal, handler)
+
+
+def send_signal(stop_signal: int, delay: float) -> None:
+    threading.Timer(delay, os.kill, (os.getpid(), stop_signal)).start()
+
+
+@pytest.mark.usefixtures("_restore_signals")
+@pytest.mark.parametrize(
+    ("processes", "exit_code", "expected_min_starts"),
+    [
+        (1, 1, 2),
+        (2, 0, 4),
+        (2, None, 2),
+    ],
+)
+def test_supervisor(
+    monkeypatch: MonkeyPatch,
+    tmp_path: Path,
+    processes: int,
+    exit_code: int | None,
+    expected_min_starts: int,
+) -> None:
+    starts = tmp_path / "starts"
+
+    def run_consumer(number: int) -> None:
+        with starts.open("a") as file:
+            file.write(f"{os.getpid()}\n")
+
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+        # stopped by supervisor
+        threading.Event().wait()
+
+    monkeypatch.setattr("aiven.consumer.supervisor.run_consumer", run_consumer)
+    send_signal(signal.SIGTERM, 1)
+    Supervisor(processes, 0.2, 1).run()
+
+    assert len(starts.read_text().split()) >= expected_min_starts
+
+
+@pytest.mark.usefixtures("_restore_signals")
+@pytest.mark.parametrize("stop_signal", [signal.SIGTERM, signal.SIGINT])
+def test_run_consumer(monkeypatch: MonkeyPatch, stop_signal: int) -> None:
+    stopped = []
+
+    async def start_workers(max_workers: int, stop_event: Event) -> None:
+        await stop_event.wait()
+        stopped.append(max_workers)
+
+    monkeypatch.setattr("aiven.consumer.supervisor.start_workers", start_workers)
+    send_signal(stop_signal, 0.2)
+    run_consumer()
+
+    assert len(stopped) == 1
+
+
+@pytest.mark.usefixtures("_restore_signals")
+@pytest.mark.parametrize("memory_diagnostics", [True, False])
+def test_supervisor_signal_handlers(monkeypatch: MonkeyPatch, tmp_path: Path, memory_diagnostics: bool) -> None:
+    """Handlers of supervisor aren't left in consumer processes, memory signal is passed only in diagnostics mode."""
+    handlers = tmp_path / "handlers"
+
+    def start_workers(max_workers: int, stop_event: Event) -> None:
+        with handlers.open("a") as file:
+            for handled_signal in (PROFILE_SIGNAL, MEMORY_SIGNAL):
+                file.write(f"{getattr(signal.getsignal(handled_signal), '__self__', None) is not None}\n")
+
+        os.kill(os.getppid(), signal.SIGTERM)
+        sys.exit(0)
+
+    monkeypatch.setattr(settings, "MEMORY_DIAGNOSTICS", memory_diagnostics)
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    monkeypatch.setattr("aiven.consumer.supervisor.start_workers", start_workers)
+    supervisor = Supervisor(1, 0.2, 1)
+    supervisor.run()
+
+    assert handlers.read_text().split() == ["False", "False"]
+    supervisor_handler = signal.getsignal(MEMORY_SIGNAL)
+    assert (getattr(supervisor_handler, "__self__", None) is supervisor) == memory_diagnostics
@@ -1,9 +1,10 @@
+import datetime
 from typing import Any
 
 import pytest
 from asyncpg import Connection
 
-from aiven.db.create_db import main
+from aiven.db.create_db import create_tables, main
 
 GET_DATABASE_DESCRIPTION = """
 SELECT TABLE_SCHEMA ,
@@ -21,6 +22,62 @@ FROM   INFORMATION_SCHEMA.COLUMNS
 WHERE TABLE_NAME=$1
 """
 
+# tables as they were created by the first release
+CREATE_FIRST_RELEASE_TABLES = """
+CREATE TABLE url
+(
+    id             SERIAL PRIMARY KEY,
+    url            VARCHAR(255) NOT NULL,
+    regex          VARCHAR(255),
+    period         SMALLINT NOT NULL DEFAULT 5,
+    created_at     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_run_at    TIMESTAMPTZ,
+    UNIQUE NULLS NOT DISTINCT (url, regex)
+);
+
+CREATE TABLE task
+(
+    id          SERIAL PRIMARY KEY,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    status      INTEGER NOT NULL DEFAULT 0,
+    url         VARCHAR(255) NOT NULL,
+    regex       VARCHAR(255)
+);
+
+CREATE TABLE task_result
+(
+    id              SERIAL PRIMARY KEY,
+    task_id         INT,
+    url             VARCHAR(255) NOT NULL,
+    timestamp       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    response_time   FLOAT,
+    status_code     SMALLINT NOT NULL DEFAULT 0,
+    error_text      TEXT,
+    regex_is_found  BOOLEAN DEFAULT TRUE,
+    regex_result    TEXT,
+    CONSTRAINT fk_task FOREIGN KEY(task_id) REFERENCES task(id) ON DELETE CASCADE
+);
+
+INSERT INTO url (url, period, last_run_at) VALUES
+    ('https://test.com', 60, '2024-01-01 00:00:00+00'),
+    ('https://test1.com', 60, NULL);
+INSERT INTO task (url) VALUES ('https://test.com');
+"""
+
+GET_COLUMNS = """
+SELECT table_name, column_name FROM information_schema.columns
+WHERE table_name = ANY($1::text[])
+ORDER BY table_name, ordinal_position;
+"""
+
+GET_URLS = """
+SELECT url, next_run_at, check_mode, next_run_at > NOW() - INTERVAL '1 min' AS is_due_now FROM url ORDER BY id;
+"""
+
+GET_CHECK_CONSTRAINTS = """
+SELECT count(*) FROM pg_constraint WHERE conrelid = 'url'::regclass AND contype = 'c';
+"""
+
 
 @pytest.mark.parametrize(
     "expected_results",
@@ -80,6 +137,32 @@ WHERE TABLE_NAME=$1
                         "table_name": "url",
                         "table_schema": "public",
                     },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": "now()",
+                        "column_name": "next_run_at",
+                        "data_type": "timestamp with time zone",
+                        "datetime_precision": 6,
+                        "numeric_precision": None,
+                        "numeric_precision_radix": None,
+                        "numeric_scale": None,
+                        "ordinal_position": 7,
+                        "table_name": "url",
+                        "table_schema": "public",
+                    },
+                    {
+                        "character_maximum_length": 16,
+                        "column_default": "'full'::character varying",
+                        "column_name": "check_mode",
+                        "data_type": "character varying",
+                        "datetime_precision": None,
+                        "numeric_precision": None,
+                        "numeric_precision_radix": None,
+                        "numeric_scale": None,
+                        "ordinal_position": 8,
+                        "table_name": "url",
+                        "table_schema": "public",
+                    },
                     {
                         "character_maximum_length": 255,
                         "column_default": None,
@@ -225,6 +308,84 @@ WHERE TABLE_NAME=$1
                         "table_name": "task_result",
                         "table_schema": "public",
                     },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": None,
+                        "column_name": "queue_time",
+                        "data_type": "double precision",
+                        "datetime_precision": None,
+                        "numeric_precision": 53,
+                        "numeric_precision_radix": 2,
+                        "numeric_scale": None,
+                        "ordinal_position": 10,
+                        "table_name": "task_result",
+                        "table_schema": "public",
+                    },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": None,
+                        "column_name": "connection_wait_time",
+                        "data_type": "double precision",
+                        "datetime_precision": None,
+                        "numeric_precision": 53,
+                        "numeric_precision_radix": 2,
+                        "numeric_scale": None,
+                        "ordinal_position": 11,
+                        "table_name": "task_result",
+                        "table_schema": "public",
+                    },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": None,
+                        "column_name": "dns_time",
+                        "data_type": "double precision",
+                        "datetime_precision": None,
+                        "numeric_precision": 53,
+                        "numeric_precision_radix": 2,
+                        "numeric_scale": None,
+                        "ordinal_position": 12,
+                        "table_name": "task_result",
+                        "table_schema": "public",
+                    },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": None,
+                        "column_name": "connect_time",
+                        "data_type": "double precision",
+                        "datetime_precision": None,
+                        "numeric_precision": 53,
+                        "numeric_precision_radix": 2,
+                        "numeric_scale": None,
+                        "ordinal_position": 13,
+                        "table_name": "task_result",
+                        "table_schema": "public",
+                    },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": None,
+                        "column_name": "first_byte_time",
+                        "data_type": "double precision",
+                        "datetime_precision": None,
+                        "numeric_precision": 53,
+                        "numeric_precision_radix": 2,
+                        "numeric_scale": None,
+                        "ordinal_position": 14,
+                        "table_name": "task_result",
+                        "table_schema": "public",
+                    },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": None,
+                        "column_name": "download_time",
+                        "data_type": "double precision",
+                        "datetime_precision": None,
+                        "numeric_precision": 53,
+                        "numeric_precision_radix": 2,
+                        "numeric_scale": None,
+                        "ordinal_position": 15,
+                        "table_name": "task_result",
+                        "table_schema": "public",
+                    },
                 ],
                 "task": [
                     {
@@ -292,6 +453,58 @@ WHERE TABLE_NAME=$1
                         "table_name": "task",
                         "table_schema": "public",
                     },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": None,
+                        "column_name": "claimed_at",
+                        "data_type": "timestamp with time zone",
+                        "datetime_precision": 6,
+                        "numeric_precision": None,
+                        "numeric_precision_radix": None,
+                        "numeric_scale": None,
+                        "ordinal_position": 6,
+                        "table_name": "task",
+                        "table_schema": "public",
+                    },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": None,
+                        "column_name": "lease_until",
+                        "data_type": "timestamp with time zone",
+                        "datetime_precision": 6,
+                        "numeric_precision": None,
+                        "numeric_precision_radix": None,
+                        "numeric_scale": None,
+                        "ordinal_position": 7,
+                        "table_name": "task",
+                        "table_schema": "public",
+                    },
+                    {
+                        "character_maximum_length": None,
+                        "column_default": "0",
+                        "column_name": "attempts",
+                        "data_type": "integer",
+                        "datetime_precision": None,
+                        "numeric_precision": 32,
+                        "numeric_precision_radix": 2,
+                        "numeric_scale": 0,
+                        "ordinal_position": 8,
+                        "table_name": "task",
+                        "table_schema": "public",
+                    },
+                    {
+                        "character_maximum_length": 16,
+                        "column_default": "'full'::character varying",
+                        "column_name": "check_mode",
+                        "data_type": "character varying",
+                        "datetime_precision": None,
+                        "numeric_precision": None,
+                        "numeric_precision_radix": None,
+                        "numeric_scale": None,
+                        "ordinal_position": 9,
+                        "table_name": "task",
+                        "table_schema": "public",
+                    },
                 ],
             }
         ),
@@ -303,3 +516,35 @@ async def test_create_db(db_connection: Connection, expected_results: dict[str,
     for table_name, expected_result in expected_results.items():
         result = [dict(row) for row in await db_connection.fetch(GET_DATABASE_DESCRIPTION, table_name)]
         assert result == expected_result
+
+
+async def test_create_db_migration(db_connection: Connection) -> None:
+    await db_connection.execute(CREATE_FIRST_RELEASE_TABLES)
+    tables = ["url", "task", "task_result"]
+    await create_tables()
+    columns = await db_connection.fetch(GET_COLUMNS, tables)
+    constraints = await db_connection.fetchval(GET_CHECK_CONSTRAINTS)
+    # migration is idempotent
+    await create_tables()
+
+    assert await db_connection.fetch(GET_COLUMNS, tables) == columns
+    assert await db_connection.fetchval(GET_CHECK_CONSTRAINTS) == constraints == 1
+    assert {(table, column) for table, column in columns} >= {
+        ("url", "next_run_at"),
+        ("url", "check_mode"),
+        ("task", "claimed_at"),
+        ("task", "lease_until"),
+        ("task", "attempts"),
+        ("task", "check_mode"),
+        ("task_result", "queue_time"),
+        ("task_result", "connection_wait_time"),
+        ("task_result", "dns_time"),
+        ("task_result", "connect_time"),
+        ("task_result", "first_byte_time"),
+        ("task_result", "download_time"),
+    }
+    test_url, test1_url = await db_connection.fetch(GET_URLS)
+    # next run is after the last one, url which has never run is due now
+    assert test_url["next_run_at"] == datetime.datetime(2024, 1, 1, 0, 1, tzinfo=datetime.timezone.utc)
+    assert test1_url["is_due_now"]
+    assert test_url["check_mode"] == test1_url["check_mode"] == "full"
@@ -1,11 +1,22 @@
 from asyncio import ensure_future, gather
 from asyncio import sleep as asleep
+from datetime import timedelta
 from typing import Any
 
 import pytest
 from asyncpg import Connection, ForeignKeyViolationError, Pool
 
-from aiven.db.crud import TaskResult, create_next_task, finish_task, get_next_task, set_result
+from aiven.db.crud import (
+    TaskResult,
+    create_next_task,
+    finish_task,
+    finish_tasks,
+    get_next_task,
+    get_next_tasks,
+    set_result,
+    set_results,
+)
+from conf.config_consumer import settings
 
 GET_TASKS = """
 SELECT * FROM task;
@@ -23,7 +34,18 @@ SELECT * FROM task_result;
         (
             "http://test.com",
             None,
-            [{"id": 1, "regex": None, "status": 0, "url": "http://test.com"}],
+            [
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "id": 1,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 0,
+                    "url": "http://test.com",
+                },
+            ],
         ),
     ],
 )
@@ -55,7 +77,7 @@ async def test_create_next_task(
                     None,
                 ),
             ],
-            [{"id": 1, "regex": None, "url": "http://test.com"}],
+            [{"check_mode": "full", "id": 1, "regex": None, "url": "http://test.com"}],
         ),
     ],
 )
@@ -68,11 +90,63 @@ async def test_get_next_task(
         url, regex = row
         await create_next_task(db_connection, url, regex)
 
-    result = [dict(await get_next_task(db_connection))]
+    result = [dict(await get_next_task(db_connection, settings.LEASE_TIME))]
 
     assert result == expected_result
 
 
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("rows", "limit", "expected_result_1", "expected_result_2"),
+    [
+        (
+            [
+                (
+                    "http://test.com",
+                    None,
+                ),
+                (
+                    "http://test1.com",
+                    ".*",
+                ),
+                (
+                    "http://test2.com",
+                    None,
+                ),
+            ],
+            2,
+            [
+                {"check_mode": "full", "id": 1, "regex": None, "url": "http://test.com"},
+                {"check_mode": "full", "id": 2, "regex": ".*", "url": "http://test1.com"},
+            ],
+            [{"check_mode": "full", "id": 3, "regex": None, "url": "http://test2.com"}],
+        ),
+    ],
+)
+async def test_get_next_tasks(
+    db_connection: Connection,
+    rows: list[tuple[str, str]],
+    limit: int,
+    expected_result_1: list[dict],
+    expected_result_2: list[dict],
+) -> None:
+    for row in rows:
+        url, regex = row
+        await create_next_task(db_connection, url, regex)
+
+    for expected_result in (expected_result_1, expected_result_2):
+        result = [dict(row) for row in await get_next_tasks(db_connection, limit, settings.LEASE_TIME)]
+        # all tasks of batch are claimed at the same time
+        assert len({row.pop("claimed_at") for row in result}) == 1
+        assert result == expected_result
+
+    assert await get_next_tasks(db_connection, limit, settings.LEASE_TIME) == []
+
+    for row in await db_connection.fetch(GET_TASKS):
+        assert row["status"] == 1
+        assert row["lease_until"] - row["claimed_at"] == timedelta(seconds=settings.LEASE_TIME)
+
+
 @pytest.mark.usefixtures("_create_tables")
 @pytest.mark.parametrize(
     ("rows", "task_id", "expected_result"),
@@ -85,7 +159,18 @@ async def test_get_next_task(
                 ),
             ],
             1,
-            [{"id": 1, "regex": None, "status": 2, "url": "http://test.com"}],
+            [
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "id": 1,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 2,
+                    "url": "http://test.com",
+                },
+            ],
         ),
     ],
 )
@@ -132,8 +217,14 @@ async def test_finish_task(
             ),
             [
                 {
+                    "connect_time": None,
+                    "connection_wait_time": None,
+                    "dns_time": None,
+                    "download_time": None,
                     "error_text": "",
+                    "first_byte_time": None,
                     "id": 1,
+                    "queue_time": None,
                     "regex_is_found": True,
                     "regex_result": "",
                     "response_time": 1.1,
@@ -166,6 +257,176 @@ async def test_set_result(
     assert result == expected_result
 
 
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("rows", "task_ids", "expected_result"),
+    [
+        (
+            [
+                (
+                    "http://test.com",
+                    None,
+                ),
+                (
+                    "http://test1.com",
+                    None,
+                ),
+                (
+                    "http://test2.com",
+                    None,
+                ),
+            ],
+            [1, 3],
+            [
+                {
+                    "attempts": 1,
+                    "check_mode": "full",
+                    "id": 1,
+                    "regex": None,
+                    "status": 2,
+                    "url": "http://test.com",
+                },
+                {
+                    "attempts": 1,
+                    "check_mode": "full",
+                    "id": 2,
+                    "regex": None,
+                    "status": 1,
+                    "url": "http://test1.com",
+                },
+                {
+                    "attempts": 1,
+                    "check_mode": "full",
+                    "id": 3,
+                    "regex": None,
+                    "status": 2,
+                    "url": "http://test2.com",
+                },
+            ],
+        ),
+    ],
+)
+async def test_finish_tasks(
+    db_connection: Connection,
+    rows: list[tuple[str, str]],
+    task_ids: list[int],
+    expected_result: list[dict],
+) -> None:
+    for row in rows:
+        url, regex = row
+        await create_next_task(db_connection, url, regex)
+
+    claimed_ats = {task["id"]: task["claimed_at"] for task in await get_next_tasks(db_connection, 10, 60)}
+    task_claimed_ats = [claimed_ats[task_id] for task_id in task_ids]
+    assert sorted(await finish_tasks(db_connection, task_ids, task_claimed_ats)) == task_ids
+    # finished task isn't held by the claim anymore
+    assert await finish_tasks(db_connection, task_ids, task_claimed_ats) == []
+
+    result = []
+    for row in await db_connection.fetch(GET_TASKS):
+        row_result = dict(row)
+        del row_result["created_at"]
+        del row_result["claimed_at"]
+        # lease is released by finishing
+        assert (row_result.pop("lease_until") is None) == (row_result["status"] == 2)
+        result.append(row_result)
+
+    assert sorted(result, key=lambda x: x["id"]) == expected_result
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("rows", "task_results", "expected_result"),
+    [
+        (
+            [
+                (
+                    "http://test.com",
+                    None,
+                ),
+                (
+                    "http://test1.com",
+                    "test",
+                ),
+            ],
+            [
+                TaskResult(
+                    task_id=1,
+                    url="http://test.com",
+                    status_code=200,
+                    response_time=1.1,
+                    error_text="",
+                    regex_is_found=False,
+                    regex_result="",
+                ),
+                TaskResult(
+                    task_id=2,
+                    url="http://test1.com",
+                    status_code=200,
+                    response_time=0.5,
+                    error_text="",
+                    regex_is_found=True,
+                    regex_result="test; test",
+                ),
+            ],
+            [
+                {
+                    "connect_time": None,
+                    "connection_wait_time": None,
+                    "dns_time": None,
+                    "download_time": None,
+                    "error_text": "",
+                    "first_byte_time": None,
+                    "id": 1,
+                    "queue_time": None,
+                    "regex_is_found": False,
+                    "regex_result": "",
+                    "response_time": 1.1,
+                    "status_code": 200,
+                    "task_id": 1,
+                    "url": "http://test.com",
+                },
+                {
+                    "connect_time": None,
+                    "connection_wait_time": None,
+                    "dns_time": None,
+                    "download_time": None,
+                    "error_text": "",
+                    "first_byte_time": None,
+                    "id": 2,
+                    "queue_time": None,
+                    "regex_is_found": True,
+                    "regex_result": "test; test",
+                    "response_time": 0.5,
+                    "status_code": 200,
+                    "task_id": 2,
+                    "url": "http://test1.com",
+                },
+            ],
+        ),
+    ],
+)
+async def test_set_results(
+    db_connection: Connection,
+    rows: list[tuple[str, str]],
+    task_results: list[TaskResult],
+    expected_result: list[dict],
+) -> None:
+    for row in rows:
+        url, regex = row
+        await create_next_task(db_connection, url, regex)
+
+    await set_results(db_connection, task_results)
+
+    result = []
+    for row in await db_connection.fetch(GET_TASKS_RESULT):
+        row_result = dict(row)
+        del row_result["timestamp"]
+        result.append(row_result)
+
+    assert sorted(result, key=lambda x: x["id"]) == expected_result
+
+
 @pytest.mark.usefixtures("_create_tables")
 @pytest.mark.parametrize(
     ("rows", "task_result", "exception"),
@@ -215,7 +476,7 @@ async def test_set_result_with_exception(
                     None,
                 ),
             ],
-            [{"id": 1, "regex": None, "url": "https://test.com"}, None],
+            [{"check_mode": "full", "id": 1, "regex": None, "url": "https://test.com"}, None],
         ),
         (
             [
@@ -229,8 +490,8 @@ async def test_set_result_with_exception(
                 ),
             ],
             [
-                {"id": 1, "regex": None, "url": "https://test.com"},
-                {"id": 2, "regex": None, "url": "https://test1.com"},
+                {"check_mode": "full", "id": 1, "regex": None, "url": "https://test.com"},
+                {"check_mode": "full", "id": 2, "regex": None, "url": "https://test1.com"},
             ],
         ),
     ],
@@ -249,7 +510,7 @@ async def test_get_next_task_with_2_workers(
         async with pool.acquire() as connection:
             async with connection.transaction():
                 result = None
-                if next_task := await get_next_task(connection):
+                if next_task := await get_next_task(connection, settings.LEASE_TIME):
                     result = dict(next_task)
 
                 await asleep(1)
@@ -9,6 +9,9 @@ from asyncpg import CheckViolationError, Connection, Pool, UniqueViolationError
 
 from aiven.db.crud import (
     create_new_url,
+    enqueue_due_urls,
+    enqueue_url_group,
+    enqueue_urls,
     get_next_url,
     remove_url_by_url,
     remove_url_by_url_and_regex,
@@ -20,6 +23,10 @@ GET_URLS = """
 SELECT * FROM url;
 """
 
+GET_TASKS = """
+SELECT url, regex, status FROM task ORDER BY id;
+"""
+
 
 @pytest.mark.usefixtures("_create_tables")
 @pytest.mark.parametrize(
@@ -29,7 +36,16 @@ SELECT * FROM url;
             "https://test.com",
             15,
             ".*",
-            [{"id": 1, "last_run_at": None, "period": 15, "regex": ".*", "url": "https://test.com"}],
+            [
+                {
+                    "check_mode": "full",
+                    "id": 1,
+                    "last_run_at": None,
+                    "period": 15,
+                    "regex": ".*",
+                    "url": "https://test.com",
+                },
+            ],
         ),
     ],
 )
@@ -45,6 +61,7 @@ async def test_create_new_url(
     for row in await db_connection.fetch(GET_URLS):
         row_result = dict(row)
         del row_result["created_at"]
+        del row_result["next_run_at"]
         result.append(row_result)
 
     assert result == expected_result
@@ -126,8 +143,22 @@ async def test_create_new_url_with_exception(
             ],
             "https://test1.com",
             [
-                {"id": 1, "last_run_at": None, "period": 15, "regex": None, "url": "https://test.com"},
-                {"id": 2, "last_run_at": None, "period": 15, "regex": ".*", "url": "https://test.com"},
+                {
+                    "check_mode": "full",
+                    "id": 1,
+                    "last_run_at": None,
+                    "period": 15,
+                    "regex": None,
+                    "url": "https://test.com",
+                },
+                {
+                    "check_mode": "full",
+                    "id": 2,
+                    "last_run_at": None,
+                    "period": 15,
+                    "regex": ".*",
+                    "url": "https://test.com",
+                },
             ],
         ),
         (
@@ -149,7 +180,16 @@ async def test_create_new_url_with_exception(
                 ),
             ],
             "https://test.com",
-            [{"id": 3, "last_run_at": None, "period": 15, "regex": ".*", "url": "https://test1.com"}],
+            [
+                {
+                    "check_mode": "full",
+                    "id": 3,
+                    "last_run_at": None,
+                    "period": 15,
+                    "regex": ".*",
+                    "url": "https://test1.com",
+                },
+            ],
         ),
     ],
 )
@@ -169,6 +209,7 @@ async def test_remove_url(
     for row in await db_connection.fetch(GET_URLS):
         row_result = dict(row)
         del row_result["created_at"]
+        del row_result["next_run_at"]
         result.append(row_result)
 
     assert result == expected_result
@@ -199,8 +240,22 @@ async def test_remove_url(
             "https://test1.com",
             "test1",
             [
-                {"id": 1, "last_run_at": None, "period": 15, "regex": None, "url": "https://test.com"},
-                {"id": 2, "last_run_at": None, "period": 15, "regex": "test", "url": "https://test.com"},
+                {
+                    "check_mode": "full",
+                    "id": 1,
+                    "last_run_at": None,
+                    "period": 15,
+                    "regex": None,
+                    "url": "https://test.com",
+                },
+                {
+                    "check_mode": "full",
+                    "id": 2,
+                    "last_run_at": None,
+                    "period": 15,
+                    "regex": "test",
+                    "url": "https://test.com",
+                },
             ],
         ),
         (
@@ -218,7 +273,16 @@ async def test_remove_url(
             ],
             "https://test.com",
             "test",
-            [{"id": 2, "last_run_at": None, "period": 15, "regex": "test1", "url": "https://test.com"}],
+            [
+                {
+                    "check_mode": "full",
+                    "id": 2,
+                    "last_run_at": None,
+                    "period": 15,
+                    "regex": "test1",
+                    "url": "https://test.com",
+                },
+            ],
         ),
     ],
 )
@@ -239,12 +303,12 @@ async def test_remove_url_with_regex(
     for row in await db_connection.fetch(GET_URLS):
         row_result = dict(row)
         del row_result["created_at"]
+        del row_result["next_run_at"]
         result.append(row_result)
 
     assert result == expected_result
 
 
-@pytest.mark.freeze_time("2024-01-01T00:00:00.000Z")
 @pytest.mark.usefixtures("_create_tables")
 @pytest.mark.parametrize(
     ("rows", "url_id", "expected_result"),
@@ -269,15 +333,9 @@ async def test_remove_url_with_regex(
             ],
             1,
             [
-                {"id": 2, "last_run_at": None, "period": 15, "regex": ".*", "url": "https://test.com"},
-                {"id": 3, "last_run_at": None, "period": 15, "regex": ".*", "url": "https://test1.com"},
-                {
-                    "id": 1,
-                    "last_run_at": datetime.datetime(2024, 1, 1, 0, 0, tzinfo=datetime.timezone.utc),
-                    "period": 15,
-                    "regex": None,
-                    "url": "https://test.com",
-                },
+                {"id": 1, "is_run": True, "next_run_after_created": datetime.timedelta(seconds=15)},
+                {"id": 2, "is_run": False, "next_run_after_created": datetime.timedelta(seconds=0)},
+                {"id": 3, "is_run": False, "next_run_after_created": datetime.timedelta(seconds=0)},
             ],
         ),
     ],
@@ -294,13 +352,16 @@ async def test_update_last_run_at(
 
     await update_last_run_at(db_connection, url_id)
 
-    result = []
-    for row in await db_connection.fetch(GET_URLS):
-        row_result = dict(row)
-        del row_result["created_at"]
-        result.append(row_result)
+    result = [
+        {
+            "id": row["id"],
+            "is_run": row["last_run_at"] is not None,
+            "next_run_after_created": row["next_run_at"] - row["created_at"],
+        }
+        for row in await db_connection.fetch(GET_URLS)
+    ]
 
-    assert result == expected_result
+    assert sorted(result, key=lambda x: x["id"]) == expected_result
 
 
 @pytest.mark.usefixtures("_create_tables")
@@ -316,7 +377,7 @@ async def test_update_last_run_at(
                 ),
             ],
             0,
-            {"id": 1, "regex": None, "url": "https://test.com"},
+            {"check_mode": "full", "id": 1, "regex": None, "url": "https://test.com"},
             None,
         ),
         (
@@ -328,8 +389,8 @@ async def test_update_last_run_at(
                 ),
             ],
             6,
-            {"id": 1, "regex": None, "url": "https://test.com"},
-            {"id": 1, "regex": None, "url": "https://test.com"},
+            {"check_mode": "full", "id": 1, "regex": None, "url": "https://test.com"},
+            {"check_mode": "full", "id": 1, "regex": None, "url": "https://test.com"},
         ),
     ],
 )
@@ -371,7 +432,7 @@ async def test_get_next_url(
                     None,
                 ),
             ],
-            [{"id": 1, "regex": None, "url": "https://test.com"}, None],
+            [{"check_mode": "full", "id": 1, "regex": None, "url": "https://test.com"}, None],
         ),
     ],
 )
@@ -399,3 +460,126 @@ async def test_get_next_url_with_2_workers(
     result = await gather(*tasks)
 
     assert expected_result == result
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("rows", "limit", "expected_amounts", "expected_tasks"),
+    [
+        (
+            [
+                (
+                    "https://test.com",
+                    5,
+                    None,
+                ),
+                (
+                    "https://test.com",
+                    5,
+                    ".*",
+                ),
+                (
+                    "https://test1.com",
+                    5,
+                    ".*",
+                ),
+            ],
+            2,
+            [2, 1, 0],
+            [
+                {"regex": None, "status": 0, "url": "https://test.com"},
+                {"regex": ".*", "status": 0, "url": "https://test.com"},
+                {"regex": ".*", "status": 0, "url": "https://test1.com"},
+            ],
+        ),
+        # all rows of url are enqueued together
+        (
+            [
+                (
+                    "https://test.com",
+                    5,
+                    None,
+                ),
+                (
+                    "https://test.com",
+                    5,
+                    ".*",
+                ),
+                (
+                    "https://test1.com",
+                    5,
+                    ".*",
+                ),
+            ],
+            1,
+            [2, 1, 0],
+            [
+                {"regex": None, "status": 0, "url": "https://test.com"},
+                {"regex": ".*", "status": 0, "url": "https://test.com"},
+                {"regex": ".*", "status": 0, "url": "https://test1.com"},
+            ],
+        ),
+    ],
+)
+async def test_enqueue_due_urls(
+    db_connection: Connection,
+    rows: list[tuple[str, int, str]],
+    limit: int,
+    expected_amounts: list[int],
+    expected_tasks: list[dict[str, Any]],
+) -> None:
+    for row in rows:
+        url, period, regex = row
+        await create_new_url(db_connection, url, period, regex)
+
+    assert [await enqueue_due_urls(db_connection, limit) for _ in expected_amounts] == expected_amounts
+    assert [dict(row) for row in await db_connection.fetch(GET_TASKS)] == expected_tasks
+
+    for row in await db_connection.fetch(GET_URLS):
+        assert row["last_run_at"] is not None
+        assert row["next_run_at"] - row["created_at"] == datetime.timedelta(seconds=row["period"])
+
+
+SET_NEXT_RUN_AT = """
+UPDATE url SET next_run_at = NOW() + INTERVAL '1 sec' * $2 WHERE regex = $1;
+"""
+
+GET_URLS_PHASE = """
+SELECT regex, EXTRACT(EPOCH FROM next_run_at - NOW())::int AS delay FROM url ORDER BY id;
+"""
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize("mode", ["single", "bulk", "schedule"])
+async def test_enqueue_urls_of_group(db_connection: Connection, mode: str) -> None:
+    """Row which isn't due is enqueued with due row of the same url and gets the same phase."""
+    await create_new_url(db_connection, "https://test.com", 60, "due")
+    await create_new_url(db_connection, "https://test.com", 60, "later")
+    await create_new_url(db_connection, "https://test.com", 60, "head", "head")
+    await create_new_url(db_connection, "https://test1.com", 60, "other")
+    for regex in ("later", "head", "other"):
+        await db_connection.execute(SET_NEXT_RUN_AT, regex, 30)
+
+    if mode == "single":
+        async with db_connection.transaction():
+            next_url = await get_next_url(db_connection)
+            assert await enqueue_url_group(db_connection, next_url["url"], next_url["check_mode"]) == 2
+    elif mode == "schedule":
+        (due_url_id,) = [row["id"] for row in await db_connection.fetch(GET_URLS) if row["regex"] == "due"]
+        amount_of_tasks, rows = await enqueue_urls(db_connection, [due_url_id])
+        assert (amount_of_tasks, len(rows)) == (2, 2)
+        # url isn't due anymore
+        assert (await enqueue_urls(db_connection, [due_url_id]))[0] == 0
+    else:
+        assert await enqueue_due_urls(db_connection, 10) == 2
+
+    assert [dict(row) for row in await db_connection.fetch(GET_TASKS)] == [
+        {"regex": "due", "status": 0, "url": "https://test.com"},
+        {"regex": "later", "status": 0, "url": "https://test.com"},
+    ]
+    assert [tuple(row) for row in await db_connection.fetch(GET_URLS_PHASE)] == [
+        ("due", 60),
+        ("later", 60),
+        ("head", 30),
+        ("other", 30),
+    ]
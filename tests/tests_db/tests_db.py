@@ -0,0 +1,25 @@
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from pytest_postgresql.executor import PostgreSQLExecutor
+from pytest_postgresql.janitor import DatabaseJanitor
+
+from aiven.db.db import get_db_pool
+from conf.config import settings
+
+
+@pytest.mark.parametrize(
+    ("min_size", "max_size"),
+    [
+        (1, 2),
+        (2, 20),
+    ],
+)
+async def test_get_db_pool(monkeypatch: MonkeyPatch, test_db: PostgreSQLExecutor, min_size: int, max_size: int) -> None:
+    monkeypatch.setattr(settings, "DB_POOL_MIN_SIZE", min_size)
+    monkeypatch.setattr(settings, "DB_POOL_MAX_SIZE", max_size)
+
+    with DatabaseJanitor(test_db.user, test_db.host, test_db.port, test_db.dbname, test_db.version, test_db.password):
+        async with get_db_pool() as pool:
+            assert pool.get_min_size() == min_size
+            assert pool.get_max_size() == max_size
+            assert pool.get_size() == min_size
@@ -0,0 +1,237 @@
+from datetime import date, timedelta
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from asyncpg import Connection
+
+from aiven.db.create_db import create_tables
+from aiven.db.crud import TaskResult, create_next_task, finish_tasks, get_next_tasks, set_results
+from aiven.db.partitions import (
+    NotPartitionedTableError,
+    create_partitions,
+    drop_partitions,
+    get_partition_day,
+    get_partition_name,
+    maintain_partitions,
+)
+from conf.config import settings
+
+GET_PARTITIONS = """
+SELECT child.relname FROM pg_inherits
+JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+WHERE parent.relname = 'task'
+ORDER BY child.relname;
+"""
+
+GET_TODAY = """
+SELECT (NOW() AT TIME ZONE 'UTC')::date;
+"""
+
+CREATE_OLD_TASK = """
+INSERT INTO task (url, regex, created_at) VALUES ('http://test.com', NULL, NOW() - INTERVAL '1 day' * $1) RETURNING id;
+"""
+
+GET_RESULT_PARTITIONS = """
+SELECT child.relname FROM pg_inherits
+JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+WHERE parent.relname = 'task_result'
+ORDER BY child.relname;
+"""
+
+CREATE_OLD_RESULT = """
+INSERT INTO task_result (task_id, url, timestamp) VALUES ($1, 'http://test.com', NOW() - INTERVAL '1 day' * $2);
+"""
+
+COUNT_RESULTS = """
+SELECT count(*) FROM task_result;
+"""
+
+CREATE_FUTURE_TASK = """
+INSERT INTO task (url, regex, created_at) VALUES ('http://test.com', NULL, NOW() + INTERVAL '1 day' * $1) RETURNING id;
+"""
+
+GET_TASK_PARTITION = """
+SELECT tableoid::regclass::text FROM task WHERE id = $1;
+"""
+
+GET_PENDING_INDEX = """
+SELECT indexdef FROM pg_indexes WHERE indexname = 'task__pending__idx';
+"""
+
+
+@pytest.fixture()
+async def _create_partitioned_tables(monkeypatch: MonkeyPatch, db_connection: Connection) -> None:
+    monkeypatch.setattr(settings, "TASK_PARTITIONING", True)
+    monkeypatch.setattr(settings, "PARTITIONS_AHEAD", 2)
+    monkeypatch.setattr(settings, "TASK_RETENTION_DAYS", 3)
+    await create_tables()
+
+
+@pytest.mark.parametrize(
+    ("table", "day", "expected_partition"),
+    [
+        ("task", date(2023, 1, 2), "task_p20230102"),
+        ("task", date(2023, 12, 31), "task_p20231231"),
+    ],
+)
+def test_get_partition_name(table: str, day: date, expected_partition: str) -> None:
+    assert get_partition_name(table, day) == expected_partition
+    assert get_partition_day(table, expected_partition) == day
+
+
+@pytest.mark.parametrize(
+    ("table", "partition"),
+    [
+        ("task", "task_default"),
+        ("task", "task_result_p20230102"),
+        ("task", "task_p2023010"),
+    ],
+)
+def test_get_partition_day_of_unknown_partition(table: str, partition: str) -> None:
+    assert get_partition_day(table, partition) is None
+
+
+@pytest.mark.usefixtures("_create_tables")
+async def test_pending_index(db_connection: Connection) -> None:
+    assert "WHERE (status = 0)" in await db_connection.fetchval(GET_PENDING_INDEX)
+
+
+@pytest.mark.usefixtures("_create_partitioned_tables")
+async def test_create_partitions(db_connection: Connection) -> None:
+    today = await db_connection.fetchval(GET_TODAY)
+    expected_partitions = [get_partition_name("task", today + timedelta(days=days)) for days in range(3)]
+    assert [row["relname"] for row in await db_connection.fetch(GET_PARTITIONS)] == [
+        "task_default",
+        *expected_partitions,
+    ]
+
+    # partitions are created only once
+    assert await create_partitions(db_connection, "task", 2) == expected_partitions
+    assert len(await db_connection.fetch(GET_PARTITIONS)) == 4
+
+
+@pytest.mark.usefixtures("_create_partitioned_tables")
+@pytest.mark.parametrize("amount_of_tasks", [1, 5])
+async def test_claim_tasks_from_partitioned_table(db_connection: Connection, amount_of_tasks: int) -> None:
+    for _ in range(amount_of_tasks):
+        await create_next_task(db_connection, "http://test.com", None)
+
+    tasks = await get_next_tasks(db_connection, 100, 60)
+    assert [task["id"] for task in tasks] == list(range(1, amount_of_tasks + 1))
+    await finish_tasks(db_connection, [task["id"] for task in tasks], [task["claimed_at"] for task in tasks])
+    assert await get_next_tasks(db_connection, 100, 60) == []
+
+
+@pytest.mark.usefixtures("_create_partitioned_tables")
+@pytest.mark.parametrize(
+    ("finished", "expected_dropped"),
+    [
+        (True, True),
+        (False, False),
+    ],
+)
+async def test_drop_partitions(db_connection: Connection, finished: bool, expected_dropped: bool) -> None:
+    today = await db_connection.fetchval(GET_TODAY)
+    old_partition = get_partition_name("task", today - timedelta(days=5))
+    await db_connection.execute(
+        f"CREATE TABLE {old_partition} PARTITION OF task "
+        f"FOR VALUES FROM ('{today - timedelta(days=5)} 00:00:00+00') TO ('{today - timedelta(days=4)} 00:00:00+00')",
+    )
+    task_id = await db_connection.fetchval(CREATE_OLD_TASK, 5)
+    (old_task,) = await get_next_tasks(db_connection, 1, 60)
+    assert old_task["id"] == task_id
+    await create_next_task(db_connection, "http://test.com", None)
+    if finished:
+        await finish_tasks(db_connection, [task_id], [old_task["claimed_at"]])
+
+    assert await drop_partitions(db_connection, "task", settings.TASK_RETENTION_DAYS) == (
+        [old_partition] if expected_dropped else []
+    )
+    partitions = [row["relname"] for row in await db_connection.fetch(GET_PARTITIONS)]
+    assert (old_partition not in partitions) == expected_dropped
+    # partition of today is never dropped
+    assert get_partition_name("task", today) in partitions
+
+    await maintain_partitions(db_connection)
+    assert len(await db_connection.fetch(GET_PARTITIONS)) == len(partitions)
+
+
+@pytest.mark.parametrize("task_partitioning", [True, False])
+async def test_partitioned_task_result(
+    monkeypatch: MonkeyPatch,
+    db_connection: Connection,
+    task_partitioning: bool,
+) -> None:
+    monkeypatch.setattr(settings, "TASK_PARTITIONING", task_partitioning)
+    monkeypatch.setattr(settings, "RESULT_PARTITIONING", True)
+    monkeypatch.setattr(settings, "PARTITIONS_AHEAD", 1)
+    monkeypatch.setattr(settings, "RESULT_RETENTION_DAYS", 3)
+    await create_tables()
+
+    today = await db_connection.fetchval(GET_TODAY)
+    old_partition = get_partition_name("task_result", today - timedelta(days=5))
+    await db_connection.execute(
+        f"CREATE TABLE {old_partition} PARTITION OF task_result "
+        f"FOR VALUES FROM ('{today - timedelta(days=5)} 00:00:00+00') TO ('{today - timedelta(days=4)} 00:00:00+00')",
+    )
+    await create_next_task(db_connection, "http://test.com", None)
+    tasks = await get_next_tasks(db_connection, 100, 60)
+    await set_results(db_connection, [TaskResult(tasks[0]["id"], "http://test.com", 200, 0.1, "", True, "")])
+    await db_connection.execute(CREATE_OLD_RESULT, tasks[0]["id"], 5)
+
+    assert [row["relname"] for row in await db_connection.fetch(GET_RESULT_PARTITIONS)] == [
+        "task_result_default",
+        old_partition,
+        get_partition_name("task_result", today),
+        get_partition_name("task_result", today + timedelta(days=1)),
+    ]
+    assert await db_connection.fetchval(COUNT_RESULTS) == 2
+
+    await maintain_partitions(db_connection)
+    assert old_partition not in [row["relname"] for row in await db_connection.fetch(GET_RESULT_PARTITIONS)]
+    assert await db_connection.fetchval(COUNT_RESULTS) == 1
+
+
+@pytest.mark.usefixtures("_create_partitioned_tables")
+async def test_create_partition_with_rows_in_default_partition(
+    monkeypatch: MonkeyPatch,
+    db_connection: Connection,
+) -> None:
+    today = await db_connection.fetchval(GET_TODAY)
+    task_id = await db_connection.fetchval(CREATE_FUTURE_TASK, 3)
+    assert await db_connection.fetchval(GET_TASK_PARTITION, task_id) == "task_default"
+
+    monkeypatch.setattr(settings, "PARTITIONS_AHEAD", 3)
+    await maintain_partitions(db_connection)
+
+    new_partition = get_partition_name("task", today + timedelta(days=3))
+    assert new_partition in [row["relname"] for row in await db_connection.fetch(GET_PARTITIONS)]
+    assert await db_connection.fetchval(GET_TASK_PARTITION, task_id) == new_partition
+    # moved task is still claimed by index of pending tasks
+    assert [task["id"] for task in await get_next_tasks(db_connection, 100, 60)] == [task_id]
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("setting", "get_partitions"),
+    [
+        ("TASK_PARTITIONING", GET_PARTITIONS),
+        ("RESULT_PARTITIONING", GET_RESULT_PARTITIONS),
+    ],
+)
+async def test_partitioning_of_existing_table(
+    monkeypatch: MonkeyPatch,
+    db_connection: Connection,
+    setting: str,
+    get_partitions: str,
+) -> None:
+    monkeypatch.setattr(settings, setting, True)
+
+    with pytest.raises(NotPartitionedTableError):
+        await create_tables()
+
+    # maintenance doesn't fail, the table is left as it is
+    await maintain_partitions(db_connection)
+    assert await db_connection.fetch(get_partitions) == []
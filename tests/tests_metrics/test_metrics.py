@@ -0,0 +1,129 @@
+from asyncio import Event, ensure_future, sleep
+
+import pytest
+from aiohttp import ClientSession
+from asyncpg import Connection, Pool
+
+from aiven.db.crud import create_new_url, create_next_task
+from aiven.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    Metric,
+    db_statement_duration,
+    get_status_class,
+    observe_statement,
+    start_metrics_server,
+)
+
+METRICS_URL = "http://127.0.0.1:8001/metrics"
+
+
+@pytest.mark.parametrize(
+    ("increments", "expected_result"),
+    [
+        (
+            [(), ()],
+            ["# HELP test_total Test", "# TYPE test_total counter", "test_total 2"],
+        ),
+        (
+            [("2xx",), ("5xx",), ("2xx",)],
+            [
+                "# HELP test_total Test",
+                "# TYPE test_total counter",
+                'test_total{status_class="2xx"} 2',
+                'test_total{status_class="5xx"} 1',
+            ],
+        ),
+    ],
+)
+def test_counter(increments: list[tuple[str, ...]], expected_result: list[str]) -> None:
+    counter = Counter("test_total", "Test", ("status_class",))
+    for labels in increments:
+        counter.inc(*labels)
+
+    assert counter.render() == expected_result
+
+
+def test_gauge() -> None:
+    gauge = Gauge("test", "Test")
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    assert gauge.render()[2:] == ["test 1"]
+
+    gauge.set(10)
+    assert gauge.render()[2:] == ["test 10"]
+
+    gauge = Gauge("test", "Test")
+    gauge.set_function(lambda: 5)
+    assert gauge.render()[2:] == ["test 5"]
+
+
+def test_histogram() -> None:
+    histogram = Histogram("test_seconds", "Test", ("statement",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value, "get")
+
+    assert histogram.render()[2:] == [
+        'test_seconds_bucket{statement="get",le="0.1"} 2',
+        'test_seconds_bucket{statement="get",le="1"} 3',
+        'test_seconds_bucket{statement="get",le="+Inf"} 4',
+        'test_seconds_sum{statement="get"} 2.65',
+        'test_seconds_count{statement="get"} 4',
+    ]
+
+
+def test_metric_without_samples() -> None:
+    with pytest.raises(TypeError):
+        Metric("test", "Test")
+
+
+@pytest.mark.parametrize(
+    ("status_code", "expected_result"),
+    [
+        (200, "2xx"),
+        (301, "3xx"),
+        (404, "4xx"),
+        (503, "5xx"),
+        (0, "error"),
+    ],
+)
+def test_get_status_class(status_code: int, expected_result: str) -> None:
+    assert get_status_class(status_code) == expected_result
+
+
+async def test_observe_statement() -> None:
+    @observe_statement
+    async def get_something() -> int:
+        return 1
+
+    assert await get_something() == 1
+    assert get_something.__name__ == "get_something"
+    assert 'aiven_db_statement_duration_seconds_count{statement="get_something"} 1' in db_statement_duration.render()
+
+
+@pytest.mark.usefixtures("_create_tables")
+async def test_metrics_server(db_pool: Pool, db_connection: Connection) -> None:
+    await create_new_url(db_connection, "http://test.com", 15)
+    for _ in range(3):
+        await create_next_task(db_connection, "http://test.com", None)
+
+    await db_connection.execute("ANALYZE url; ANALYZE task;")
+
+    stop_event = Event()
+    server = ensure_future(start_metrics_server(stop_event, db_pool, "127.0.0.1", 8001, 1))
+    await sleep(0.1)
+    try:
+        async with ClientSession() as session:
+            async with session.get(METRICS_URL) as resp:
+                assert resp.status == 200
+                assert resp.content_type == "text/plain"
+                text = await resp.text()
+    finally:
+        stop_event.set()
+        await server
+
+    assert 'aiven_rows_estimate{relation="url"} 1' in text
+    assert 'aiven_rows_estimate{relation="pending_task"} 3' in text
+    assert 'aiven_db_statement_duration_seconds_count{statement="create_next_task"}' in text
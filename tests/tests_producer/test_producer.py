@@ -2,6 +2,7 @@ from asyncio import Event, ensure_future, gather, sleep
 from typing import Any
 
 import pytest
+from _pytest.monkeypatch import MonkeyPatch
 from asyncpg import Connection, PostgresError
 
 from aiven.db.crud import create_new_url
@@ -26,7 +27,17 @@ SELECT * FROM task;
                 ),
             ],
             2,
-            [{"regex": None, "status": 0, "url": "https://test.com"}],
+            [
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 0,
+                    "url": "https://test.com",
+                },
+            ],
         ),
         (
             [
@@ -43,8 +54,24 @@ SELECT * FROM task;
             ],
             2,
             [
-                {"regex": None, "status": 0, "url": "https://test.com"},
-                {"regex": None, "status": 0, "url": "https://test1.com"},
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 0,
+                    "url": "https://test.com",
+                },
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 0,
+                    "url": "https://test1.com",
+                },
             ],
         ),
     ],
@@ -75,6 +102,92 @@ async def test_producer(
     assert sorted(result, key=lambda x: x["url"]) == expected_result
 
 
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("rows", "amount_of_workers", "enqueue_batch_size", "expected_result"),
+    [
+        (
+            [
+                (
+                    "https://test.com",
+                    5,
+                    None,
+                ),
+                (
+                    "https://test1.com",
+                    5,
+                    ".*",
+                ),
+                (
+                    "https://test2.com",
+                    5,
+                    None,
+                ),
+            ],
+            1,
+            2,
+            [
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 0,
+                    "url": "https://test.com",
+                },
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "lease_until": None,
+                    "regex": ".*",
+                    "status": 0,
+                    "url": "https://test1.com",
+                },
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 0,
+                    "url": "https://test2.com",
+                },
+            ],
+        ),
+    ],
+)
+async def test_producer_bulk_mode(
+    monkeypatch: MonkeyPatch,
+    db_connection: Connection,
+    rows: list[tuple[str, int, str | None]],
+    amount_of_workers: int,
+    enqueue_batch_size: int,
+    expected_result: dict[str, Any],
+) -> None:
+    monkeypatch.setattr(settings, "MODE", "bulk")
+    monkeypatch.setattr(settings, "ENQUEUE_BATCH_SIZE", enqueue_batch_size)
+    for row in rows:
+        url, period, regex = row
+        await create_new_url(db_connection, url, period, regex)
+
+    stop_event = Event()
+    tasks = [ensure_future(start_workers(amount_of_workers, stop_event))]
+    await sleep(1)
+    stop_event.set()
+    await gather(*tasks)
+
+    result = []
+    for row in await db_connection.fetch(GET_TASKS):
+        row_result = dict(row)
+        del row_result["created_at"]
+        del row_result["id"]
+        result.append(row_result)
+
+    assert sorted(result, key=lambda x: x["url"]) == expected_result
+
+
 @pytest.mark.usefixtures("_create_tables", "_mock_get_new_url_with_exception")
 @pytest.mark.parametrize(
     ("rows", "sleep_time", "amount_of_workers", "exception", "amount_of_exception", "expected_result"),
@@ -116,8 +229,24 @@ async def test_producer(
             PostgresError,
             2,
             [
-                {"regex": None, "status": 0, "url": "https://test.com"},
-                {"regex": None, "status": 0, "url": "https://test1.com"},
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 0,
+                    "url": "https://test.com",
+                },
+                {
+                    "attempts": 0,
+                    "check_mode": "full",
+                    "claimed_at": None,
+                    "lease_until": None,
+                    "regex": None,
+                    "status": 0,
+                    "url": "https://test1.com",
+                },
             ],
         ),
     ],
@@ -0,0 +1,114 @@
+from asyncio import Event, ensure_future, gather, sleep
+from typing import Any
+
+import pytest
+from _pytest.monkeypatch import MonkeyPatch
+from asyncpg import Connection
+
+from aiven.db.crud import create_new_url, remove_url_by_url
+from aiven.producer.scheduler import UrlSchedule
+from aiven.producer.worker import start_workers
+from conf.config_producer import settings
+
+GET_TASKS = """
+SELECT url, regex, status FROM task ORDER BY id;
+"""
+
+
+@pytest.mark.parametrize(
+    ("scheduled", "removed", "now", "limit", "expected_due", "expected_next_due_at"),
+    [
+        ([(1, 10.0), (2, 5.0), (3, 20.0)], [], 12.0, 10, [2, 1], 20.0),
+        ([(1, 10.0), (2, 5.0), (3, 20.0)], [], 12.0, 1, [2], 10.0),
+        ([(1, 10.0), (2, 5.0), (3, 20.0)], [2], 12.0, 10, [1], 20.0),
+        ([(1, 10.0), (2, 5.0), (1, 30.0)], [], 12.0, 10, [2], 30.0),
+        ([(1, 10.0)], [1], 12.0, 10, [], None),
+    ],
+)
+def test_url_schedule(
+    scheduled: list[tuple[int, float]],
+    removed: list[int],
+    now: float,
+    limit: int,
+    expected_due: list[int],
+    expected_next_due_at: float | None,
+) -> None:
+    schedule = UrlSchedule()
+    for url_id, due_at in scheduled:
+        schedule.schedule(url_id, due_at)
+
+    for url_id in removed:
+        schedule.remove(url_id)
+
+    assert schedule.pop_due(now, limit) == expected_due
+    assert schedule.next_due_at() == expected_next_due_at
+
+
+@pytest.mark.usefixtures("_create_tables")
+@pytest.mark.parametrize(
+    ("rows", "added_rows", "removed_urls", "expected_result"),
+    [
+        (
+            [
+                (
+                    "https://test.com",
+                    5,
+                    None,
+                ),
+            ],
+            [
+                (
+                    "https://test1.com",
+                    5,
+                    ".*",
+                ),
+            ],
+            [],
+            [
+                {"regex": None, "status": 0, "url": "https://test.com"},
+                {"regex": ".*", "status": 0, "url": "https://test1.com"},
+            ],
+        ),
+        (
+            [
+                (
+                    "https://test.com",
+                    5,
+                    None,
+                ),
+            ],
+            [],
+            ["https://test.com"],
+            [{"regex": None, "status": 0, "url": "https://test.com"}],
+        ),
+    ],
+)
+async def test_producer_schedule_mode(
+    monkeypatch: MonkeyPatch,
+    db_connection: Connection,
+    rows: list[tuple[str, int, str | None]],
+    added_rows: list[tuple[str, int, str | None]],
+    removed_urls: list[str],
+    expected_result: list[dict[str, Any]],
+) -> None:
+    monkeypatch.setattr(settings, "MODE", "schedule")
+    for row in rows:
+        url, period, regex = row
+        await create_new_url(db_connection, url, period, regex)
+
+    stop_event = Event()
+    tasks = [ensure_future(start_workers(1, stop_event))]
+    await sleep(0.5)
+
+    for row in added_rows:
+        url, period, regex = row
+        await create_new_url(db_connection, url, period, regex)
+
+    for url in removed_urls:
+        await remove_url_by_url(db_connection, url)
+
+    await sleep(0.5)
+    stop_event.set()
+    await gather(*tasks)
+
+    assert [dict(row) for row in await db_connection.fetch(GET_TASKS)] == expected_result
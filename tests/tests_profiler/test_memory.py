@@ -0,0 +1,57 @@
+import os
+from asyncio import get_running_loop, sleep
+from pathlib import Path
+
+from aiven.memory import MEMORY_SIGNAL, MemoryTracker, add_memory_diagnostics
+
+LEAK = []
+
+
+def leak(amount: int) -> None:
+    LEAK.extend(bytearray(1024) for _ in range(amount))
+
+
+def test_memory_tracker(tmp_path: Path) -> None:
+    tracker = MemoryTracker("test", 5, 2, str(tmp_path))
+    tracker.start()
+    try:
+        leak(1000)
+        tracker.take_snapshot()
+        assert len(tracker.since_start) <= 5
+        assert tracker.since_start[0].traceback[0].filename == __file__
+        assert tracker.since_start[0].size_diff >= 1000 * 1024
+        assert tracker.since_previous[0].traceback[0].filename == __file__
+
+        tracker.take_snapshot()
+        # nothing was leaked since previous snapshot
+        assert all(statistic.size_diff < 1000 * 1024 for statistic in tracker.since_previous)
+
+        path = tracker.dump()
+    finally:
+        tracker.stop()
+        LEAK.clear()
+
+    report = path.read_text()
+    assert path.name.startswith(f"test-{os.getpid()}-")
+    assert report.startswith("Growth since start, top 5:\n")
+    assert f"{__file__}:" in report
+    assert "Growth since previous snapshot, top 5:" in report
+
+
+async def test_memory_diagnostics(tmp_path: Path) -> None:
+    tracker = MemoryTracker("test", 5, 1, str(tmp_path))
+    loop = get_running_loop()
+    add_memory_diagnostics(loop, tracker, 0.05)
+    try:
+        leak(100)
+        await sleep(0.1)
+        assert tracker.since_start
+
+        os.kill(os.getpid(), MEMORY_SIGNAL)
+        await sleep(0.05)
+    finally:
+        loop.remove_signal_handler(MEMORY_SIGNAL)
+        tracker.stop()
+        LEAK.clear()
+
+    assert len(list(tmp_path.iterdir())) == 1
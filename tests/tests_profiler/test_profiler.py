@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+from asyncio import get_running_loop, sleep
+from pathlib import Path
+
+import pytest
+
+from aiven.profiler import PROFILE_SIGNAL, StackSampler, add_profile_signal_handler, collapse_stack
+
+
+def busy_function(duration: float) -> None:
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        pass
+
+
+def test_collapse_stack() -> None:
+    stack = collapse_stack(sys._getframe()).split(";")
+    assert stack[-1] == f"test_collapse_stack ({__file__}:{test_collapse_stack.__code__.co_firstlineno})"
+    assert len(stack) > 1
+
+
+@pytest.mark.parametrize("duration", [0.2])
+def test_stack_sampler(tmp_path: Path, duration: float) -> None:
+    sampler = StackSampler("test", 0.001, duration, str(tmp_path))
+    assert sampler.start()
+    assert not sampler.start()
+    busy_function(duration)
+    sampler.join()
+    assert not sampler.running
+
+    (profile,) = tmp_path.iterdir()
+    assert profile.name.startswith(f"test-{os.getpid()}-")
+    stacks = {}
+    for line in profile.read_text().splitlines():
+        stack, amount = line.rsplit(" ", 1)
+        stacks[stack] = int(amount)
+
+    assert sum(amount for stack, amount in stacks.items() if "busy_function" in stack) > 0
+
+
+async def test_profile_signal_handler(tmp_path: Path) -> None:
+    sampler = StackSampler("test", 0.001, 0.1, str(tmp_path))
+    loop = get_running_loop()
+    add_profile_signal_handler(loop, sampler)
+    try:
+        os.kill(os.getpid(), PROFILE_SIGNAL)
+        await sleep(0.05)
+        assert sampler.running
+        await sleep(0.1)
+        sampler.join()
+    finally:
+        loop.remove_signal_handler(PROFILE_SIGNAL)
+
+    assert len(list(tmp_path.iterdir())) == 1